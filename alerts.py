@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+MENTION = "@everyone"
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+class TokenBucket:
+    def __init__(self, rate=0.5, capacity=3):
+        """
+        Initialize the TokenBucket class.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (int): Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AlertDispatcher:
+    def __init__(self, bot, channel_id, rate=0.5, burst=3, coalesce_window=2.0, max_queue=1000,
+                 max_lines=40):
+        """
+        Initialize the AlertDispatcher class.
+
+        Alerts are queued without awaiting Discord, so probe loops never wait on
+        REST calls. A background task collects everything queued within
+        `coalesce_window` seconds into one summary message and sends it through
+        a token bucket, so a mass outage becomes a few messages instead of a
+        burst that hits Discord rate limits.
+
+        Args:
+            bot: Hikari bot instance
+            channel_id (int): Channel ID to send alerts to
+            rate (float): Messages per second allowed on average
+            burst (int): Messages that may be sent back to back
+            coalesce_window (float): Seconds to wait for more alerts before sending
+            max_queue (int): Maximum queued alerts, older ones are dropped beyond this
+            max_lines (int): Alerts listed per summary, the rest are only counted
+        """
+        self.bot = bot
+        self.channel_id = channel_id
+        self.bucket = TokenBucket(rate, burst)
+        self.coalesce_window = coalesce_window
+        self.max_queue = max_queue
+        self.max_lines = max_lines
+        self.dropped = 0
+        self.sent = 0
+        self._queue = None
+        self._task = None
+
+    def _get_queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def send(self, content):
+        """
+        Queue an alert without waiting for it to be delivered
+
+        Args:
+            content (str): Alert text, may start with @everyone
+        """
+        queue = self._get_queue()
+        if queue.qsize() >= self.max_queue:
+            # Keep the newest alerts, the oldest ones are stale by now
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(content)
+
+    def start(self):
+        """Start the background delivery task if it is not running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        """Deliver queued alerts forever"""
+        queue = self._get_queue()
+        while True:
+            batch = [await queue.get()]
+            # Give the rest of the round a moment to report its transitions
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            for message in self.merge(batch):
+                await self.bucket.acquire()
+                try:
+                    await self.bot.rest.create_message(self.channel_id, content=message)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"Error sending alert message: {e}")
+
+    def merge(self, alerts):
+        """
+        Merge alerts into as few Discord messages as possible
+
+        Args:
+            alerts (list): Alert texts in the order they were queued
+
+        Returns:
+            list: Message contents, each under Discord's length limit
+        """
+        if len(alerts) == 1:
+            return [alerts[0][:DISCORD_MESSAGE_LIMIT]]
+
+        mention = any(alert.startswith(MENTION) for alert in alerts)
+        lines = [alert[len(MENTION):].strip() if alert.startswith(MENTION) else alert for alert in alerts]
+        header = f"{MENTION} " if mention else ""
+        header += f"📋 {len(alerts)} monitor updates:"
+        if len(lines) > self.max_lines:
+            omitted = len(lines) - self.max_lines
+            lines = lines[:self.max_lines] + [f"… and {omitted} more"]
+
+        # Only the first part pings; later parts of the same batch are marked as continued
+        continuation = f"📋 {len(alerts)} monitor updates (continued):"
+        messages = []
+        current = header
+        for line in lines:
+            line = f"• {line}"[:DISCORD_MESSAGE_LIMIT - max(len(header), len(continuation)) - 1]
+            if len(current) + 1 + len(line) > DISCORD_MESSAGE_LIMIT:
+                messages.append(current)
+                current = continuation
+            current += "\n" + line
+        messages.append(current)
+        return messages
+
+    async def close(self):
+        """Stop the delivery task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
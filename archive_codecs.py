@@ -0,0 +1,422 @@
+"""
+Archive codecs for backups.
+
+A codec name is a family plus an optional level, e.g. "zip-deflate:9" or
+"tar.zst:3". Zip codecs write a regular .zip through zipfile. Tar codecs write
+a tar stream and compress it in independent blocks across a thread pool
+(zlib, zstd and lz4 all release the GIL), so compression uses every core.
+Concatenated gzip members, zstd frames and lz4 frames are all valid single
+files for the standard tools.
+
+zstd and lz4 are optional: they need the zstandard / lz4 packages and are
+simply unavailable without them.
+"""
+import gzip
+import hashlib
+import io
+import os
+import posixpath
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Default block size for parallel compression
+BLOCK_SIZE = 1024 * 1024
+
+# Chunk size used when copying file content into an archive
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Tar entries are buffered in memory up to this size, and in a temp file beyond it
+TAR_SPOOL_SIZE = 8 * 1024 * 1024
+
+# Family -> (extension, default level)
+FAMILIES = {
+    "zip-store": (".zip", None),
+    "zip-deflate": (".zip", 6),
+    "tar.gz": (".tar.gz", 6),
+    "tar.zst": (".tar.zst", 3),
+    "tar.lz4": (".tar.lz4", 0),
+}
+
+# Every extension an archive written by this module can have
+ARCHIVE_EXTENSIONS = tuple(sorted({extension for extension, _ in FAMILIES.values()}))
+
+
+def parse_codec(name):
+    """
+    Split a codec name into family and level
+
+    Returns:
+        tuple: (family, level)
+    """
+    family, _, level = name.partition(":")
+    if family not in FAMILIES:
+        raise ValueError(f"Unknown archive codec {name!r}, expected one of {', '.join(FAMILIES)}")
+    if family == "tar.zst" and zstandard is None:
+        raise ValueError("The tar.zst codec needs the zstandard package")
+    if family == "tar.lz4" and lz4_frame is None:
+        raise ValueError("The tar.lz4 codec needs the lz4 package")
+    return family, int(level) if level else FAMILIES[family][1]
+
+
+def available_codecs():
+    """Codec families usable with the installed packages"""
+    available = ["zip-store", "zip-deflate", "tar.gz"]
+    if zstandard is not None:
+        available.append("tar.zst")
+    if lz4_frame is not None:
+        available.append("tar.lz4")
+    return available
+
+
+def codec_extension(name):
+    """File extension of archives written with a codec"""
+    return FAMILIES[parse_codec(name)[0]][0]
+
+
+def strip_archive_extension(path):
+    """Path without its archive extension"""
+    for extension in ARCHIVE_EXTENSIONS:
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return os.path.splitext(path)[0]
+
+
+class ParallelCompressor(io.RawIOBase):
+    def __init__(self, fileobj, family, level, workers=None, block_size=BLOCK_SIZE):
+        """
+        Initialize the ParallelCompressor class.
+
+        A write-only stream that cuts its input into blocks, compresses each
+        block as an independent gzip member / zstd frame / lz4 frame on a
+        thread pool and writes the results to `fileobj` in order. At most two
+        blocks per worker are in flight, so memory stays bounded.
+
+        Args:
+            fileobj: Binary file the compressed stream is written to
+            family (str): "tar.gz", "tar.zst" or "tar.lz4"
+            level (int): Compression level
+            workers (int): Compression threads, defaults to the CPU count
+            block_size (int): Uncompressed bytes per block
+        """
+        super().__init__()
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._compress = self._block_compressor(family, level)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    @staticmethod
+    def _block_compressor(family, level):
+        if family == "tar.gz":
+            return lambda block: gzip.compress(block, compresslevel=level, mtime=0)
+        if family == "tar.zst":
+            compressor_level = level
+            # ZstdCompressor objects are not thread-safe, so make one per block
+            return lambda block: zstandard.ZstdCompressor(level=compressor_level).compress(block)
+        if family == "tar.lz4":
+            return lambda block: lz4_frame.compress(block, compression_level=level)
+        raise ValueError(f"{family} is not a block-compressed codec")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_in += len(data)
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block):
+        self._pending.append(self._executor.submit(self._compress, block))
+        self._drain(self.workers * 2)
+
+    def _drain(self, limit):
+        while len(self._pending) > limit:
+            compressed = self._pending.popleft().result()
+            self.fileobj.write(compressed)
+            self.bytes_out += len(compressed)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            self._drain(0)
+        finally:
+            self._executor.shutdown(wait=True)
+            self.fileobj.close()
+            super().close()
+
+
+def open_compressed(path, codec, workers=None):
+    """
+    Open a raw compressed output stream for a tar codec
+
+    Returns:
+        ParallelCompressor: Writable stream that compresses into `path`
+    """
+    family, level = parse_codec(codec)
+    if not family.startswith("tar."):
+        raise ValueError(f"{codec} does not produce a compressed stream")
+    return ParallelCompressor(open(path, "wb"), family, level, workers)
+
+
+class _Reader(io.RawIOBase):
+    """Read-only wrapper that feeds a hash object with every chunk read"""
+
+    def __init__(self, fileobj, digest):
+        super().__init__()
+        self.fileobj = fileobj
+        self.digest = digest
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if self.digest is not None:
+            self.digest.update(data)
+        return data
+
+
+class ArchiveWriter:
+    def __init__(self, path, codec="zip-deflate:6", workers=None):
+        """
+        Initialize the ArchiveWriter class.
+
+        Args:
+            path (str): Archive path, including the codec's extension
+            codec (str): Codec name, e.g. "zip-store", "zip-deflate:9", "tar.zst:3"
+            workers (int): Compression threads for tar codecs
+        """
+        self.path = path
+        self.codec = codec
+        self.family, self.level = parse_codec(codec)
+        self._stream = None
+        if self.family.startswith("zip"):
+            compression = zipfile.ZIP_STORED if self.family == "zip-store" else zipfile.ZIP_DEFLATED
+            self._zip = zipfile.ZipFile(path, "w", compression, compresslevel=self.level)
+            self._tar = None
+        else:
+            self._zip = None
+            self._stream = open_compressed(path, codec, workers)
+            self._tar = tarfile.open(fileobj=self._stream, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_stream(self, arcname, fileobj, size, mtime=None, mode=0o100644, digest=None):
+        """
+        Add a file from an open binary stream
+
+        The stream is read to its end, so a file that changed size since
+        `size` was taken is stored as it was read.
+
+        Args:
+            arcname (str): Path inside the archive
+            fileobj: Binary stream, expected to hold `size` bytes
+            size (int): Expected content length in bytes
+            mtime (float): Modification time, defaults to now
+            mode (int): File mode bits
+            digest: Optional hashlib object updated with the content
+
+        Returns:
+            int: Bytes actually stored
+        """
+        mtime = time.time() if mtime is None else mtime
+        reader = _Reader(fileobj, digest)
+        written = 0
+        if self._zip is not None:
+            # Zip timestamps cannot go before 1980
+            zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(max(mtime, 315532800))[:6])
+            zinfo.compress_type = self._zip.compression
+            # Python 3.13 renamed the private _compresslevel attribute to compress_level
+            if hasattr(zinfo, "compress_level"):
+                zinfo.compress_level = self.level
+            else:
+                zinfo._compresslevel = self.level
+            zinfo.external_attr = (mode or 0o100644) << 16
+            with self._zip.open(zinfo, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as entry:
+                for chunk in iter(lambda: reader.read(COPY_CHUNK_SIZE), b""):
+                    entry.write(chunk)
+                    written += len(chunk)
+        else:
+            # A streamed tar header goes out before the data and must hold its exact size,
+            # so buffer the content first instead of trusting `size`
+            with tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_SIZE) as spool:
+                for chunk in iter(lambda: reader.read(COPY_CHUNK_SIZE), b""):
+                    spool.write(chunk)
+                    written += len(chunk)
+                spool.seek(0)
+                tarinfo = tarfile.TarInfo(arcname)
+                tarinfo.size = written
+                tarinfo.mtime = mtime
+                tarinfo.mode = (mode or 0o100644) & 0o7777
+                self._tar.addfile(tarinfo, spool)
+        return written
+
+    def add_file(self, local_path, arcname, digest=None):
+        """Add a local file"""
+        st = os.stat(local_path)
+        with open(local_path, "rb") as f:
+            return self.add_stream(arcname, f, st.st_size, st.st_mtime, st.st_mode, digest)
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+            self._stream.close()
+            self._tar = None
+
+
+def _open_tar_reader(archive_path):
+    """Open a tar archive of any codec for streaming reads"""
+    if archive_path.endswith(".tar.zst"):
+        if zstandard is None:
+            raise ValueError("Reading .tar.zst archives needs the zstandard package")
+        raw = open(archive_path, "rb")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return tarfile.open(fileobj=stream, mode="r|")
+    if archive_path.endswith(".tar.lz4"):
+        if lz4_frame is None:
+            raise ValueError("Reading .tar.lz4 archives needs the lz4 package")
+        return tarfile.open(fileobj=lz4_frame.open(archive_path, "rb"), mode="r|")
+    if archive_path.endswith(".tar.gz"):
+        # GzipFile reads every member; tarfile's own gzip reader stops after the first
+        return tarfile.open(fileobj=gzip.open(archive_path, "rb"), mode="r|")
+    return tarfile.open(archive_path, mode="r|*")
+
+
+def list_files(archive_path):
+    """
+    List regular files in an archive
+
+    Returns:
+        dict: Normalized path -> (size, mtime)
+    """
+    files = {}
+    if archive_path.endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zipf:
+            for info in zipf.infolist():
+                if not info.is_dir():
+                    files[info.filename] = (info.file_size, time.mktime(info.date_time + (0, 0, -1)))
+        return files
+
+    with _open_tar_reader(archive_path) as tar:
+        for member in tar:
+            if member.isfile():
+                files[posixpath.normpath(member.name)] = (member.size, member.mtime)
+    return files
+
+
+def extract(archive_path, names, target_dir):
+    """
+    Extract the named files from an archive of any codec
+
+    Args:
+        archive_path (str): Archive to read
+        names (list): Normalized paths of the files to extract
+        target_dir (str): Directory to extract into
+    """
+    if archive_path.endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zipf:
+            for arcname in names:
+                zipf.extract(arcname, target_dir)
+        return
+
+    wanted = set(names)
+    with _open_tar_reader(archive_path) as tar:
+        for member in tar:
+            name = posixpath.normpath(member.name)
+            if name not in wanted:
+                continue
+            member.name = name
+            if hasattr(tarfile, "data_filter"):
+                tar.extract(member, target_dir, filter="data")
+            else:
+                tar.extract(member, target_dir)
+
+
+def iter_entries(archive_path, names):
+    """
+    Read the named regular files from an archive of any codec
+
+    Zip entries come in the order given; tar entries in archive order, since a
+    compressed tar stream can only be read front to back. Names that are not
+    in the archive are skipped.
+
+    Yields:
+        tuple: (name, size, mode, fileobj), the file object is only valid until the next item
+    """
+    if archive_path.endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zipf:
+            for name in names:
+                try:
+                    info = zipf.getinfo(name)
+                except KeyError:
+                    continue
+                with zipf.open(info) as entry:
+                    yield name, info.file_size, info.external_attr >> 16, entry
+        return
+
+    wanted = set(names)
+    with _open_tar_reader(archive_path) as tar:
+        for member in tar:
+            name = posixpath.normpath(member.name)
+            if member.isfile() and name in wanted:
+                yield name, member.size, member.mode, tar.extractfile(member)
+
+
+def hash_file(path):
+    """SHA-256 of a whole file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_entries(archive_path, names):
+    """
+    Read and hash the named files of an archive. Reading a zip entry to the
+    end also checks its CRC, so a corrupt entry raises instead of hashing.
+
+    Returns:
+        dict: Name -> (size, sha256) for every name found
+    """
+    result = {}
+    for name, _, _, entry in iter_entries(archive_path, names):
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in iter(lambda: entry.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        result[name] = (size, digest.hexdigest())
+    return result
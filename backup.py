@@ -1,162 +1,907 @@
 import os
-import zipfile
 import datetime
 import io
-import paramiko
 import tempfile
 import shutil
 import stat
 import posixpath 
-from io import StringIO
+import time
+import queue
+import json
+import hashlib
+import shlex
+import archive_codecs
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from ssh_pool import SSHPool
+from catalog import BackupCatalog
+from metrics import REGISTRY, DURATION_BUCKETS, SIZE_BUCKETS
+
+BACKUPS = REGISTRY.counter("backups", "Backup runs by kind and result", ("kind", "result"))
+BACKUP_SECONDS = REGISTRY.histogram("backup_duration_seconds", "Wall time of successful backups", ("kind",),
+                                    buckets=DURATION_BUCKETS)
+BACKUP_BYTES = REGISTRY.histogram("backup_size_bytes", "Archive size of successful backups", ("kind",),
+                                  buckets=SIZE_BUCKETS)
+BACKUP_FILES = REGISTRY.counter("backup_files", "Files written into backup archives", ("kind",))
+
+# Remote directories that are never backed up
+EXCLUDED_DIRS = ('venv', '__pycache__')
+
+# Chunk size used when copying remote files into archive entries
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Bytes of remote tar's stderr kept for error messages
+TAR_STDERR_LIMIT = 64 * 1024
+
+# Sidecar file written next to every archive
+MANIFEST_SUFFIX = ".manifest.json"
+
+# File extensions of the archives this class writes
+ARCHIVE_EXTENSIONS = archive_codecs.ARCHIVE_EXTENSIONS
 
 class Backup:
     def __init__(self, backup_dir="backups", max_backups=5, 
                  ssh_host=None, ssh_port=22, ssh_username=None, 
                  ssh_key_passphrase=None, 
-                 remote_dir="/var/www/student_app"):
+                 remote_dir="/var/www/student_app", mode="stream", transfer_workers=8,
+                 hash_files=True, codec="zip-deflate:6", compression_workers=None,
+                 ssh_pool=None, keep_daily=7, keep_weekly=4, keep_monthly=12, catalog=None):
         """
         Initialize the Backup class.
         
         Args:
             backup_dir (str): Local directory to store backups
-            max_backups (int): Maximum number of backups to keep
+            max_backups (int): Newest backups always kept, on top of the daily/weekly/monthly ones
             ssh_host (str): SSH server hostname/IP
             ssh_port (int): SSH server port
             ssh_username (str): SSH username
             ssh_key_passphrase (str): Passphrase for the SSH key
             remote_dir (str): Remote directory to backup
+            mode (str): How files get into the archive: "stream" reads each remote
+                        file straight into its zip entry, "tempdir" downloads the
+                        whole tree to a temporary directory first, "parallel" does
+                        the same download with a pool of SFTP channels, "tar" runs
+                        tar on the server and streams the archive over one SSH channel
+            transfer_workers (int): SFTP channels used by the "parallel" mode
+            hash_files (bool): Record a SHA-256 of every file in the backup manifest,
+                               which verify_backup and restore_backup check against
+            codec (str): Archive codec, e.g. "zip-store", "zip-deflate:9", "tar.gz:6",
+                         "tar.zst:3" or "tar.lz4" (see archive_codecs.py)
+            compression_workers (int): Threads used by block-parallel tar codecs,
+                                       defaults to the CPU count
+            ssh_pool (SSHPool): Shared connection pool, one is created from the
+                                SSH settings if not given
+            keep_daily (int): Days for which the newest backup is kept
+            keep_weekly (int): Weeks for which the newest backup is kept
+            keep_monthly (int): Months for which the newest backup is kept
+            catalog (BackupCatalog): Backup index, defaults to catalog.db in backup_dir
         """
         self.backup_dir = backup_dir
         self.max_backups = max_backups
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.keep_monthly = keep_monthly
         self.ssh_host = ssh_host
         self.ssh_port = ssh_port
         self.ssh_username = ssh_username
         self.ssh_key_passphrase = ssh_key_passphrase
+        self.ssh_pool = ssh_pool or SSHPool(ssh_host, ssh_port, ssh_username, ssh_key_passphrase)
         self.remote_dir = remote_dir
+        self.mode = mode
+        self.transfer_workers = transfer_workers
+        self.last_transfer_stats = None
+        self.hash_files = hash_files
+        self.codec = codec
+        self.compression_workers = compression_workers
+        # Fail early on an unknown codec or a missing optional package
+        archive_codecs.parse_codec(codec)
         
         # Create backup directory if it doesn't exist
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
+        
+        self.catalog = catalog or BackupCatalog(os.path.join(backup_dir, "catalog.db"))
+        if self.catalog.count() == 0:
+            self._import_existing_backups()
+    
+    def create_backup(self):
+        """
+        Create a backup of the remote directory excluding venv.
+        
+        Returns:
+            str: Path to the created backup file
+        """
+        return self._run_backup(incremental_base=None)
     
-    def _connect_ssh(self):
+    def create_incremental_backup(self, full_every=7):
         """
-        Establish SSH connection to the server.
+        Create a backup holding only files that changed since the previous backup.
+        
+        The remote tree is listed with listdir_attr and compared against the
+        newest manifest by size and mtime; only new or changed files are
+        fetched, and removed files are recorded as deletions. After
+        `full_every` incrementals in a row the next backup is a full one
+        again, and the first backup without any manifest is always full.
+        
+        Args:
+            full_every (int): Maximum incrementals in a row before a new full backup
         
         Returns:
-            paramiko.SSHClient: Connected SSH client
+            str: Path to the created backup file
         """
+        previous = self._latest_manifest()
+        if previous is None or previous.get("chain", 0) >= full_every:
+            return self.create_backup()
+        return self._run_backup(incremental_base=previous)
+    
+    def _run_backup(self, incremental_base):
+        # Generate timestamp for backup filename
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = "_incremental" if incremental_base else ""
+        extension = archive_codecs.codec_extension(self.codec)
+        remote_tar = self.mode == "tar" and not incremental_base
+        if remote_tar and extension == ".zip":
+            # Zip codecs can't wrap a tar stream, so keep the server-side gzip
+            extension = ".tar.gz"
+        backup_filename = f"website_backup_{timestamp}{suffix}{extension}"
+        backup_path = os.path.join(self.backup_dir, backup_filename)
+        started = time.time()
+        
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Load private key from environment variable
-            ssh_key_data = os.getenv("SSH_KEY")
-            if not ssh_key_data:
-                raise ValueError("SSH_KEY environment variable is not set or empty.")
+            # Borrow a warm connection from the pool; it goes back when the block ends
+            with self.ssh_pool.connection() as ssh_client:
+                if not ssh_client:
+                    print("Failed to establish SSH connection")
+                    BACKUPS.inc("incremental" if incremental_base else "full", "error")
+                    return None
+                
+                if remote_tar:
+                    files = self._tar_backup(ssh_client, backup_path)
+                    deleted = []
+                else:
+                    # Get SFTP client
+                    sftp = ssh_client.open_sftp()
+                    
+                    try:
+                        if not incremental_base and self.mode in ("tempdir", "parallel"):
+                            # The download walk lists the tree itself, so don't walk it twice
+                            files = self._tempdir_backup(ssh_client, sftp, backup_path)
+                            deleted = []
+                        else:
+                            # One listing pass gives both the file list and the manifest
+                            listing = self._remote_listing(sftp, self.remote_dir)
+                            if incremental_base:
+                                files, deleted = self._incremental_backup(sftp, backup_path, listing,
+                                                                          incremental_base)
+                            else:
+                                files = self._stream_backup(sftp, backup_path, listing)
+                                deleted = []
+                    finally:
+                        sftp.close()
             
-            # Replace literal \n with actual newlines
-            ssh_key_data = ssh_key_data.replace("\\n", "\n")
+            self._write_manifest(backup_path, files, incremental_base, deleted)
+            duration = time.time() - started
+            self._catalog_backup(backup_path, files, incremental_base, started, duration)
+            self._record_metrics(backup_path, files, incremental_base, duration)
             
-            # Load the private key
-            private_key = paramiko.Ed25519Key.from_private_key(StringIO(ssh_key_data), password=self.ssh_key_passphrase)
+            # Manage backup retention
+            self._cleanup_old_backups()
             
-            # Connect to the server
-            client.connect(
-                hostname=self.ssh_host,
-                port=self.ssh_port,
-                username=self.ssh_username,
-                pkey=private_key
-            )
+            return backup_path
             
-            return client
         except Exception as e:
-            print(f"SSH connection error: {e}")
+            print(f"Backup creation error: {e}")
+            BACKUPS.inc("incremental" if incremental_base else "full", "error")
+            # Don't leave a truncated archive behind
+            for path in (backup_path, self._manifest_path(backup_path)):
+                if os.path.exists(path):
+                    os.remove(path)
             return None
     
-    def create_backup(self):
+    def _remote_listing(self, sftp, remote_dir, arc_dir=""):
         """
-        Create a backup of the remote directory excluding venv.
+        Walk the remote tree with listdir_attr
         
         Returns:
-            str: Path to the created backup file
+            dict: Archive name -> (remote path, SFTPAttributes) for every file
         """
-        # Generate timestamp for backup filename
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"website_backup_{timestamp}.zip"
-        backup_path = os.path.join(self.backup_dir, backup_filename)
-        
+        listing = {}
+        for item in sftp.listdir_attr(remote_dir):
+            if item.filename in EXCLUDED_DIRS:
+                continue
+            
+            remote_path = posixpath.join(remote_dir, item.filename)
+            arcname = posixpath.join(arc_dir, item.filename) if arc_dir else item.filename
+            
+            if stat.S_ISDIR(item.st_mode):
+                listing.update(self._remote_listing(sftp, remote_path, arcname))
+            else:
+                listing[arcname] = (remote_path, item)
+        return listing
+    
+    def _manifest_entry(self, attrs, archive, sha256=None, size=None):
+        entry = {"size": attrs.st_size if size is None else size, "mtime": attrs.st_mtime, "archive": archive}
+        if sha256:
+            entry["sha256"] = sha256
+        return entry
+    
+    def _tempdir_backup(self, ssh_client, sftp, backup_path):
+        """Download the tree to a temporary directory, then zip it"""
+        archive = os.path.basename(backup_path)
+        files = {}
+        # Filled by the download walk: archive name -> (remote path, SFTPAttributes)
+        listing = {}
         # Create temporary directory for files
         temp_dir = tempfile.mkdtemp()
         
         try:
-            # Connect to SSH
-            ssh_client = self._connect_ssh()
-            if not ssh_client:
-                print("Failed to establish SSH connection")
-                return None
-            
-            # Get SFTP client
-            sftp = ssh_client.open_sftp()
-            
             # Recursively download files (excluding venv)
-            self._download_dir(sftp, self.remote_dir, temp_dir)
-            
-            # Close connections
-            sftp.close()
-            ssh_client.close()
+            if self.mode == "parallel":
+                self._download_dir_parallel(ssh_client, self.remote_dir, temp_dir, listing)
+            else:
+                self._download_dir(sftp, self.remote_dir, temp_dir, listing)
             
-            # Create zip file from downloaded content
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(temp_dir):
-                    for file in files:
+            # Create the archive from downloaded content
+            with self._open_archive(backup_path) as writer:
+                for root, _, local_files in os.walk(temp_dir):
+                    for file in local_files:
                         file_path = os.path.join(root, file)
                         # Make the path relative to temp_dir
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zipf.write(file_path, arcname)
+                        arcname = os.path.relpath(file_path, temp_dir).replace(os.sep, "/")
+                        digest = hashlib.sha256() if self.hash_files else None
+                        size = writer.add_file(file_path, arcname, digest)
+                        
+                        if arcname in listing:
+                            sha256 = digest.hexdigest() if digest else None
+                            files[arcname] = self._manifest_entry(listing[arcname][1], archive, sha256, size)
+        finally:
+            # Clean up temp directory
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return files
+    
+    def _hash_local(self, file_path):
+        return archive_codecs.hash_file(file_path)
+    
+    def _stream_backup(self, sftp, backup_path, listing):
+        """Read every remote file straight into its zip entry, without a local copy"""
+        archive = os.path.basename(backup_path)
+        files = {}
+        with self._open_archive(backup_path) as writer:
+            for arcname, (remote_path, attrs) in listing.items():
+                sha256, size = self._stream_file(sftp, remote_path, arcname, attrs, writer)
+                files[arcname] = self._manifest_entry(attrs, archive, sha256, size)
+        return files
+    
+    def _incremental_backup(self, sftp, backup_path, listing, previous):
+        """Stream only files that are new or changed since the previous manifest"""
+        archive = os.path.basename(backup_path)
+        previous_files = previous["files"]
+        files = {}
+        changed = 0
+        with self._open_archive(backup_path) as writer:
+            for arcname, (remote_path, attrs) in listing.items():
+                old = previous_files.get(arcname)
+                if old and old["size"] == attrs.st_size and old["mtime"] == attrs.st_mtime:
+                    # Unchanged - keep pointing at the archive that holds it
+                    files[arcname] = old
+                    continue
+                sha256, size = self._stream_file(sftp, remote_path, arcname, attrs, writer)
+                files[arcname] = self._manifest_entry(attrs, archive, sha256, size)
+                changed += 1
+        
+        deleted = sorted(set(previous_files) - set(listing))
+        print(f"Incremental backup: {changed} new or changed, {len(deleted)} deleted, "
+              f"{len(files) - changed} unchanged files")
+        return files, deleted
+    
+    def _open_archive(self, backup_path):
+        return archive_codecs.ArchiveWriter(backup_path, self.codec, self.compression_workers)
+    
+    def _stream_file(self, sftp, remote_path, arcname, attrs, writer):
+        """
+        Copy one remote file into an archive entry through a prefetching SFTP handle
+        
+        Returns:
+            tuple: (SHA-256 of the content if hash_files is enabled, otherwise None, bytes stored)
+        """
+        print(f"Streaming: {remote_path} -> {arcname}")
+        size = attrs.st_size or 0
+        digest = hashlib.sha256() if self.hash_files else None
+        
+        with sftp.open(remote_path, 'rb') as remote_file:
+            # Pipeline read requests instead of one round trip per block
+            remote_file.prefetch(size)
+            stored = writer.add_stream(arcname, remote_file, size, attrs.st_mtime, attrs.st_mode, digest)
+        if stored != size:
+            print(f"{remote_path} changed while being read: listed {size} bytes, stored {stored}")
+        return (digest.hexdigest() if digest else None), stored
+    
+    def _tar_backup(self, ssh_client, backup_path):
+        """
+        Run tar on the server and stream the archive over a single exec channel.
+        
+        One bulk stream replaces the per-file SFTP round trips; the venv and
+        __pycache__ exclusions are applied by tar on the remote side. The
+        manifest is read back from the local archive afterwards.
+        """
+        # With a tar codec the server sends plain tar and compression runs here on
+        # every core; otherwise the server gzips the stream itself
+        local_compression = backup_path.endswith(archive_codecs.codec_extension(self.codec))
+        flags = "-cf" if local_compression else "-czf"
+        excludes = " ".join(f"--exclude={shlex.quote(name)}" for name in EXCLUDED_DIRS)
+        command = f"tar {flags} - {excludes} -C {shlex.quote(self.remote_dir)} ."
+        print(f"Streaming remote tar: {command}")
+        
+        stdin, stdout, stderr = ssh_client.exec_command(command)
+        stdin.close()
+        channel = stdout.channel
+        # Unread stderr holds up the channel window and with it stdout, so drain it alongside
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            error_future = executor.submit(self._drain_stderr, channel)
+            if local_compression:
+                output = archive_codecs.open_compressed(backup_path, self.codec, self.compression_workers)
+            else:
+                output = open(backup_path, "wb")
+            with output:
+                for chunk in iter(lambda: channel.recv(COPY_CHUNK_SIZE), b""):
+                    output.write(chunk)
+            exit_status = channel.recv_exit_status()
+            error_output = error_future.result()
+        
+        # GNU tar exits with 1 when files changed while being read; the archive is still complete
+        if exit_status == 1:
+            print(f"Remote tar finished with warnings: {error_output}")
+        elif exit_status != 0:
+            raise RuntimeError(f"Remote tar failed with exit status {exit_status}: {error_output}")
+        
+        archive = os.path.basename(backup_path)
+        files = {
+            name: {"size": size, "mtime": mtime, "archive": archive}
+            for name, (size, mtime) in archive_codecs.list_files(backup_path).items()
+        }
+        if self.hash_files:
+            for name, (_, sha256) in archive_codecs.hash_entries(backup_path, list(files)).items():
+                files[name]["sha256"] = sha256
+        return files
+    
+    @staticmethod
+    def _drain_stderr(channel):
+        """Read a channel's stderr until EOF, keeping only the last TAR_STDERR_LIMIT bytes"""
+        kept = b""
+        for chunk in iter(lambda: channel.recv_stderr(COPY_CHUNK_SIZE), b""):
+            kept = (kept + chunk)[-TAR_STDERR_LIMIT:]
+        return kept.decode("utf-8", errors="replace").strip()
+    
+    def _manifest_path(self, backup_path):
+        return archive_codecs.strip_archive_extension(backup_path) + MANIFEST_SUFFIX
+    
+    def _write_manifest(self, backup_path, files, base, deleted):
+        """Store path, size, mtime (and hash) of every file next to the archive"""
+        manifest = {
+            "archive": os.path.basename(backup_path),
+            "type": "incremental" if base else "full",
+            "base": base["archive"] if base else None,
+            "chain": base.get("chain", 0) + 1 if base else 0,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "remote_dir": self.remote_dir,
+            "files": files,
+            "deleted": deleted,
+        }
+        with open(self._manifest_path(backup_path), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    
+    def load_manifest(self, backup_path):
+        """
+        Load the manifest stored next to a backup archive
+        
+        Returns:
+            dict: The manifest, or None if the archive has none
+        """
+        try:
+            with open(self._manifest_path(backup_path), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _latest_manifest(self):
+        latest = self.catalog.latest()
+        if latest is None:
+            return None
+        return self.load_manifest(os.path.join(self.backup_dir, latest["archive"]))
+    
+    def _catalog_backup(self, backup_path, files, base, created, duration):
+        """Index a finished backup with its size, checksum and file count"""
+        archive = os.path.basename(backup_path)
+        self.catalog.add(
+            archive,
+            created,
+            "incremental" if base else "full",
+            os.path.getsize(backup_path),
+            len(files),
+            sha256=self._hash_local(backup_path),
+            duration=duration,
+            base=base["archive"] if base else None,
+            requires={entry["archive"] for entry in files.values()}
+        )
+    
+    def _record_metrics(self, backup_path, files, base, duration):
+        kind = "incremental" if base else "full"
+        archive = os.path.basename(backup_path)
+        BACKUPS.inc(kind, "ok")
+        BACKUP_SECONDS.observe(duration, kind)
+        BACKUP_BYTES.observe(os.path.getsize(backup_path), kind)
+        # Incremental snapshots also list files that live in older archives
+        BACKUP_FILES.inc(kind, amount=sum(1 for entry in files.values() if entry["archive"] == archive))
+    
+    def backup_report(self, limit=10):
+        """
+        Summarize the newest backups from the catalog
+        
+        Args:
+            limit (int): Number of backups to list
+        
+        Returns:
+            list: One line per backup, with the retention rules that keep it
+        """
+        keep, _ = self.catalog.retention(
+            keep_last=self.max_backups,
+            keep_daily=self.keep_daily,
+            keep_weekly=self.keep_weekly,
+            keep_monthly=self.keep_monthly
+        )
+        lines = []
+        for row in self.catalog.backups(limit=limit):
+            created = datetime.datetime.fromtimestamp(row["created"]).strftime("%Y-%m-%d %H:%M")
+            duration = f"{row['duration']:.1f}s" if row["duration"] is not None else "?"
+            checksum = row["sha256"][:12] if row["sha256"] else "-"
+            lines.append(
+                f"`{created}` {row['kind']}: {row['size'] / (1024 * 1024):.2f}MB, {row['file_count']} files, "
+                f"{duration}, sha256 `{checksum}` ({', '.join(keep.get(row['archive'], ['prune']))})"
+            )
+        return lines
+    
+    def _import_existing_backups(self):
+        """Index archives written before the catalog existed (runs once, on an empty catalog)"""
+        for filename in os.listdir(self.backup_dir):
+            if not (filename.startswith("website_backup_") and filename.endswith(ARCHIVE_EXTENSIONS)):
+                continue
+            backup_path = os.path.join(self.backup_dir, filename)
+            manifest = self.load_manifest(backup_path) or {"files": {}, "type": "full"}
+            try:
+                created = datetime.datetime.fromisoformat(manifest["created"]).timestamp()
+            except (KeyError, ValueError):
+                created = os.path.getmtime(backup_path)
+            self.catalog.add(
+                filename,
+                created,
+                manifest.get("type", "full"),
+                os.path.getsize(backup_path),
+                len(manifest["files"]),
+                base=manifest.get("base"),
+                requires={entry["archive"] for entry in manifest["files"].values()}
+            )
+    
+    def rebuild_snapshot(self, backup_path, target_dir):
+        """
+        Rebuild the full tree as it was at a backup, from its base plus incrementals.
+        
+        The manifest records which archive holds the current version of every
+        file, so each file is extracted exactly once, straight from the archive
+        that holds it, and deleted files are simply not part of the result.
+        
+        Args:
+            backup_path (str): Full or incremental backup to restore
+            target_dir (str): Local directory to write the snapshot to
+        
+        Returns:
+            int: Number of files restored
+        """
+        manifest, by_archive = self._snapshot_by_archive(backup_path)
+        
+        os.makedirs(target_dir, exist_ok=True)
+        restored = 0
+        for archive, names in by_archive.items():
+            archive_codecs.extract(os.path.join(self.backup_dir, archive), names, target_dir)
+            for arcname in names:
+                expected = manifest["files"][arcname].get("sha256")
+                if expected and self._hash_local(os.path.join(target_dir, arcname)) != expected:
+                    raise ValueError(f"Checksum mismatch for {arcname} from {archive}")
+                restored += 1
+        return restored
+    
+    def _snapshot_by_archive(self, backup_path):
+        """Group a backup's snapshot by the archive that holds each file"""
+        manifest = self.load_manifest(backup_path)
+        if manifest is None:
+            raise ValueError(f"No manifest found for {backup_path}")
+        by_archive = {}
+        for arcname, entry in manifest["files"].items():
+            by_archive.setdefault(entry["archive"], []).append(arcname)
+        return manifest, by_archive
+    
+    def verify_backup(self, backup_path, workers=None):
+        """
+        Check that every file of a backup's snapshot can be read back intact.
+        
+        Each archive's checksum is compared with the catalog, and every entry
+        is decompressed and compared with the size and SHA-256 in the manifest.
+        The work is spread over a thread pool, which scales because hashlib
+        and the decompressors release the GIL on large buffers, and which,
+        unlike forking, is safe in the bot's multithreaded process. Zip
+        archives are split into chunks of entries, while tar streams (which
+        can only be read front to back) get one worker per archive.
+        
+        Args:
+            backup_path (str): Full or incremental backup to verify
+            workers (int): Worker threads, defaults to the CPU count
+        
+        Returns:
+            dict: ok, files, archives, problems (list of str) and seconds
+        """
+        start = time.perf_counter()
+        manifest, by_archive = self._snapshot_by_archive(backup_path)
+        workers = workers or os.cpu_count() or 1
+        problems = []
+        checked = {}
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for archive, names in by_archive.items():
+                archive_path = os.path.join(self.backup_dir, archive)
+                if not os.path.exists(archive_path):
+                    problems.append(f"{archive} is missing")
+                    continue
+                row = self.catalog.get(archive)
+                if row is not None and row["sha256"]:
+                    futures[executor.submit(archive_codecs.hash_file, archive_path)] = (archive, None, row["sha256"])
+                if archive.endswith(".zip"):
+                    chunk_size = max(1, -(-len(names) // workers))
+                    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+                else:
+                    chunks = [names]
+                for chunk in chunks:
+                    futures[executor.submit(archive_codecs.hash_entries, archive_path, chunk)] = (archive, chunk, None)
             
-            # Manage backup retention
-            self._cleanup_old_backups()
+            for future in as_completed(futures):
+                archive, chunk, archive_sha256 = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    problems.append(f"{archive} could not be read: {e}")
+                    continue
+                if chunk is None:
+                    if result != archive_sha256:
+                        problems.append(f"{archive} does not match its catalog checksum")
+                    continue
+                checked.update(result)
+                for arcname in chunk:
+                    entry = manifest["files"][arcname]
+                    if arcname not in result:
+                        problems.append(f"{arcname} is missing from {archive}")
+                    elif result[arcname][0] != entry["size"]:
+                        problems.append(f"{arcname} in {archive} is {result[arcname][0]} bytes, expected {entry['size']}")
+                    elif entry.get("sha256") and result[arcname][1] != entry["sha256"]:
+                        problems.append(f"{arcname} in {archive} has a bad checksum")
+        
+        return {
+            "ok": not problems,
+            "files": len(checked),
+            "archives": len(by_archive),
+            "problems": problems,
+            "seconds": time.perf_counter() - start,
+        }
+    
+    def restore_backup(self, backup_path, verify=True, keep_previous=True):
+        """
+        Restore a backup's snapshot to remote_dir over SFTP.
+        
+        Entries are streamed out of the archives straight into remote files
+        over a pool of SFTP channels, into a staging directory next to
+        remote_dir. The excluded venv/__pycache__ dirs are moved over from the
+        live tree, then the staging directory is renamed into place, so the site
+        goes from the old tree to the complete new one in two renames.
+        
+        Args:
+            backup_path (str): Full or incremental backup to restore
+            verify (bool): Run verify_backup first and refuse a damaged backup
+            keep_previous (bool): Keep the replaced tree as remote_dir.pre-restore-<timestamp>
+        
+        Returns:
+            dict: Restore statistics, or None if the restore failed
+        """
+        start = time.perf_counter()
+        try:
+            if verify:
+                report = self.verify_backup(backup_path)
+                if not report["ok"]:
+                    print(f"Refusing to restore {backup_path}: {'; '.join(report['problems'][:10])}")
+                    return None
             
-            return backup_path
+            manifest, by_archive = self._snapshot_by_archive(backup_path)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            remote_dir = self.remote_dir.rstrip("/")
+            staging = f"{remote_dir}.restore-{timestamp}"
+            previous = f"{remote_dir}.pre-restore-{timestamp}"
             
+            with self.ssh_pool.connection() as ssh_client:
+                if not ssh_client:
+                    print("Failed to establish SSH connection")
+                    return None
+                channels = queue.Queue()
+                opened = []
+                try:
+                    for _ in range(max(1, self.transfer_workers)):
+                        channel = ssh_client.open_sftp()
+                        opened.append(channel)
+                        channels.put(channel)
+                    sftp = opened[0]
+                    
+                    try:
+                        self._make_remote_dirs(sftp, staging, manifest["files"])
+                        uploaded = self._upload_snapshot(channels, len(opened), staging, manifest["files"], by_archive)
+                        self._swap_remote_dirs(sftp, remote_dir, staging, previous)
+                    except Exception:
+                        # Never rm -rf a staging dir that still holds the live venv/__pycache__
+                        stranded = self._live_dirs_in(sftp, staging)
+                        if stranded:
+                            print(f"Leaving {staging} in place, it still holds the live {', '.join(stranded)}")
+                        else:
+                            self._remove_remote_tree(ssh_client, staging)
+                        raise
+                    
+                    if not keep_previous:
+                        self._remove_remote_tree(ssh_client, previous)
+                finally:
+                    for channel in opened:
+                        channel.close()
+            
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            stats = {
+                "files": len(manifest["files"]),
+                "bytes": uploaded,
+                "seconds": elapsed,
+                "mb_per_second": uploaded / (1024 * 1024) / elapsed,
+                "previous": previous if keep_previous else None,
+            }
+            print(f"Restored {stats['files']} files ({uploaded / (1024 * 1024):.1f} MB) to {remote_dir} "
+                  f"in {elapsed:.2f}s")
+            return stats
         except Exception as e:
-            print(f"Backup creation error: {e}")
+            print(f"Restore error: {e}")
             return None
-        finally:
-            # Clean up temp directory
-            shutil.rmtree(temp_dir, ignore_errors=True)
     
-    def _download_dir(self, sftp, remote_dir, local_dir):
+    def _make_remote_dirs(self, sftp, staging, files):
+        """Create the staging directory and every directory the snapshot needs"""
+        directories = {staging}
+        for arcname in files:
+            parent = posixpath.dirname(arcname)
+            while parent:
+                directories.add(posixpath.join(staging, parent))
+                parent = posixpath.dirname(parent)
+        # Sorted so parents come before their children
+        for directory in sorted(directories):
+            sftp.mkdir(directory)
+    
+    def _upload_snapshot(self, channels, workers, staging, files, by_archive):
+        """
+        Stream every snapshot entry into the staging directory
+        
+        Returns:
+            int: Bytes uploaded
+        """
+        def upload(name, fileobj, size, mode):
+            sftp = channels.get()
+            try:
+                remote_path = posixpath.join(staging, name)
+                sftp.putfo(fileobj, remote_path, size, confirm=False)
+                mtime = files[name]["mtime"]
+                sftp.utime(remote_path, (mtime, mtime))
+                if mode & 0o7777:
+                    sftp.chmod(remote_path, mode & 0o7777)
+            finally:
+                channels.put(sftp)
+            return size
+        
+        def upload_zip_chunk(archive_path, names):
+            # Each worker opens its own handle on the zip, so entries decompress in parallel
+            return sum(upload(name, entry, size, mode)
+                       for name, size, mode, entry in archive_codecs.iter_entries(archive_path, names))
+        
+        uploaded = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for archive, names in by_archive.items():
+                archive_path = os.path.join(self.backup_dir, archive)
+                if archive.endswith(".zip"):
+                    chunk_size = max(1, -(-len(names) // workers))
+                    for i in range(0, len(names), chunk_size):
+                        pending.add(executor.submit(upload_zip_chunk, archive_path, names[i:i + chunk_size]))
+                    continue
+                
+                # A tar stream is read front to back here; small files are buffered and
+                # handed to the pool, large ones are uploaded straight from the stream
+                for name, size, mode, entry in archive_codecs.iter_entries(archive_path, names):
+                    if size > COPY_CHUNK_SIZE * 8:
+                        uploaded += upload(name, entry, size, mode)
+                        continue
+                    if len(pending) >= workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        uploaded += sum(future.result() for future in done)
+                    pending.add(executor.submit(upload, name, io.BytesIO(entry.read()), size, mode))
+            
+            uploaded += sum(future.result() for future in pending)
+        return uploaded
+    
+    def _swap_remote_dirs(self, sftp, remote_dir, staging, previous):
+        """Move the excluded dirs into the staging tree and rename it into place"""
+        try:
+            sftp.stat(remote_dir)
+            live = True
+        except FileNotFoundError:
+            live = False
+        
+        moved = []
+        retired = False
+        try:
+            if live:
+                # venv and __pycache__ are not in backups, carry them over from the live tree
+                for name in EXCLUDED_DIRS:
+                    try:
+                        sftp.rename(posixpath.join(remote_dir, name), posixpath.join(staging, name))
+                        moved.append(name)
+                    except FileNotFoundError:
+                        pass
+                sftp.rename(remote_dir, previous)
+                retired = True
+            sftp.rename(staging, remote_dir)
+        except Exception:
+            # Put the old tree back the way it was, undoing the steps in reverse
+            if retired:
+                sftp.rename(previous, remote_dir)
+            for name in reversed(moved):
+                sftp.rename(posixpath.join(staging, name), posixpath.join(remote_dir, name))
+            raise
+    
+    def _live_dirs_in(self, sftp, staging):
+        """Excluded dirs present in a staging tree; backups never contain them, so they came from the live site"""
+        present = []
+        for name in EXCLUDED_DIRS:
+            try:
+                sftp.stat(posixpath.join(staging, name))
+                present.append(name)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                # Can't tell, so assume the worst
+                present.append(name)
+        return present
+    
+    def _remove_remote_tree(self, ssh_client, path):
+        stdin, stdout, stderr = ssh_client.exec_command(f"rm -rf -- {shlex.quote(path)}")
+        stdout.channel.recv_exit_status()
+    
+    def _download_dir(self, sftp, remote_dir, local_dir, listing=None, arc_dir=""):
         os.makedirs(local_dir, exist_ok=True)
 
         for item in sftp.listdir_attr(remote_dir):
-            if item.filename in ('venv', '__pycache__'):
+            if item.filename in EXCLUDED_DIRS:
                 continue
 
             remote_path = posixpath.join(remote_dir, item.filename)  # ✅ always forward slashes
             local_path = os.path.join(local_dir, item.filename)      # ✅ local filesystem
+            arcname = posixpath.join(arc_dir, item.filename) if arc_dir else item.filename
 
             if stat.S_ISDIR(item.st_mode):
-                self._download_dir(sftp, remote_path, local_path)
+                self._download_dir(sftp, remote_path, local_path, listing, arcname)
             else:
                 print(f"Downloading: {remote_path} -> {local_path}")  # helpful log
                 sftp.get(remote_path, local_path)
+                if listing is not None:
+                    listing[arcname] = (remote_path, item)
     
-    def _cleanup_old_backups(self):
-        """Delete old backups if exceeding max_backups limit."""
-        backups = []
+    def _download_dir_parallel(self, ssh_client, remote_dir, local_dir, listing=None):
+        """
+        Download a remote tree with a bounded pool of SFTP channels.
         
-        for filename in os.listdir(self.backup_dir):
-            if filename.startswith("website_backup_") and filename.endswith(".zip"):
-                file_path = os.path.join(self.backup_dir, filename)
-                backups.append((file_path, os.path.getmtime(file_path)))
+        Directory listings and file downloads are both pool tasks, so listing
+        one directory overlaps with downloads from another, and small files no
+        longer wait on each other's round trips.
+        
+        Args:
+            listing (dict): Filled with archive name -> (remote path, SFTPAttributes)
+                            for every downloaded file, if given
+        
+        Returns:
+            dict: Transfer statistics (files, bytes, seconds, MB/s, files/s)
+        """
+        channels = queue.Queue()
+        opened = []
+        for _ in range(max(1, self.transfer_workers)):
+            channel = ssh_client.open_sftp()
+            opened.append(channel)
+            channels.put(channel)
+        
+        totals = {"files": 0, "bytes": 0}
+        start = time.perf_counter()
         
-        # Sort by modification time (newest first)
-        backups.sort(key=lambda x: x[1], reverse=True)
+        def list_dir(remote_path, local_path, arc_dir):
+            sftp = channels.get()
+            try:
+                items = sftp.listdir_attr(remote_path)
+            finally:
+                channels.put(sftp)
+            os.makedirs(local_path, exist_ok=True)
+            
+            # Hand children back so only this thread submits new tasks
+            children = []
+            for item in items:
+                if item.filename in EXCLUDED_DIRS:
+                    continue
+                child_remote = posixpath.join(remote_path, item.filename)
+                child_local = os.path.join(local_path, item.filename)
+                arcname = posixpath.join(arc_dir, item.filename) if arc_dir else item.filename
+                if stat.S_ISDIR(item.st_mode):
+                    children.append((list_dir, child_remote, child_local, arcname))
+                else:
+                    if listing is not None:
+                        listing[arcname] = (child_remote, item)
+                    children.append((fetch, child_remote, child_local))
+            return children
+        
+        def fetch(remote_path, local_path):
+            sftp = channels.get()
+            try:
+                sftp.get(remote_path, local_path)
+            finally:
+                channels.put(sftp)
+            return os.path.getsize(local_path)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=len(opened)) as executor:
+                pending = {executor.submit(list_dir, remote_dir, local_dir, "")}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        if isinstance(result, list):
+                            for task, *args in result:
+                                pending.add(executor.submit(task, *args))
+                        else:
+                            totals["files"] += 1
+                            totals["bytes"] += result
+        finally:
+            for channel in opened:
+                channel.close()
+        
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        megabytes = totals["bytes"] / (1024 * 1024)
+        self.last_transfer_stats = {
+            "files": totals["files"],
+            "bytes": totals["bytes"],
+            "seconds": elapsed,
+            "mb_per_second": megabytes / elapsed,
+            "files_per_second": totals["files"] / elapsed,
+            "workers": len(opened),
+        }
+        print(f"Downloaded {totals['files']} files ({megabytes:.1f} MB) in {elapsed:.2f}s with "
+              f"{len(opened)} SFTP channels: {megabytes / elapsed:.2f} MB/s, "
+              f"{totals['files'] / elapsed:.0f} files/s")
+        return self.last_transfer_stats
+    
+    def _cleanup_old_backups(self):
+        """Delete backups that fall outside the daily/weekly/monthly retention."""
+        _, prune = self.catalog.retention(
+            keep_last=self.max_backups,
+            keep_daily=self.keep_daily,
+            keep_weekly=self.keep_weekly,
+            keep_monthly=self.keep_monthly
+        )
         
-        # Remove oldest backups if exceeding max_backups
-        for file_path, _ in backups[self.max_backups:]:
-            os.remove(file_path)
+        for archive in prune:
+            file_path = os.path.join(self.backup_dir, archive)
+            for path in (file_path, self._manifest_path(file_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.catalog.remove(archive)
     
 async def send_backup_to_channel(self, bot, channel_id):
     """
@@ -0,0 +1,315 @@
+"""
+Upload backup archives to Discord, splitting the ones over the attachment limit.
+
+Archives are streamed from disk with hikari.File rather than read into memory.
+An archive larger than one part is sent as numbered parts of at most
+`part_size` bytes, each with its own SHA-256, and a .parts.json manifest is
+posted first so the parts can be checked and joined again later. Each part is
+streamed straight from its byte range of the archive, so uploading needs no
+extra disk space:
+
+    python backup_upload.py reassemble downloads/website_backup_20250101_000000.zip.parts.json
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import hikari
+
+# Discord's attachment limit used by the bot
+DISCORD_LIMIT = 25 * 1024 * 1024
+
+# Default part size, leaving headroom under the limit for the multipart request
+PART_SIZE = 24 * 1024 * 1024
+
+# Chunk size used when copying parts to and from disk
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Suffix of the manifest that describes a split archive
+PARTS_SUFFIX = ".parts.json"
+
+
+def _part_name(archive_name, index):
+    return f"{archive_name}.part{index:03d}"
+
+
+def plan_parts(archive_path, part_size=PART_SIZE):
+    """
+    Work out the parts of an archive, hashing each part and the whole file in one pass
+
+    Nothing is written; every part records the offset of its byte range in the archive.
+
+    Args:
+        archive_path (str): Archive to split
+        part_size (int): Maximum bytes per part
+
+    Returns:
+        dict: The .parts.json manifest
+    """
+    archive_name = os.path.basename(archive_path)
+    total_digest = hashlib.sha256()
+    parts = []
+    offset = 0
+
+    with open(archive_path, "rb") as src:
+        while True:
+            chunk = src.read(min(COPY_CHUNK_SIZE, part_size))
+            if not chunk:
+                break
+            part_digest = hashlib.sha256()
+            size = 0
+            while chunk:
+                part_digest.update(chunk)
+                total_digest.update(chunk)
+                size += len(chunk)
+                if size >= part_size:
+                    break
+                chunk = src.read(min(COPY_CHUNK_SIZE, part_size - size))
+            parts.append({"name": _part_name(archive_name, len(parts) + 1), "offset": offset,
+                          "size": size, "sha256": part_digest.hexdigest()})
+            offset += size
+
+    return {
+        "archive": archive_name,
+        "size": offset,
+        "sha256": total_digest.hexdigest(),
+        "part_size": part_size,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "parts": parts
+    }
+
+
+def _read_range(path, offset, size):
+    """Yield `size` bytes of a file starting at `offset`, in chunks"""
+    with open(path, "rb") as src:
+        src.seek(offset)
+        while size > 0:
+            chunk = src.read(min(COPY_CHUNK_SIZE, size))
+            if not chunk:
+                raise ValueError(f"{path} ended {size} bytes before the end of the part")
+            size -= len(chunk)
+            yield chunk
+
+
+def split_archive(archive_path, part_size=PART_SIZE, parts_dir=None):
+    """
+    Split an archive into numbered part files on disk
+
+    Args:
+        archive_path (str): Archive to split
+        part_size (int): Maximum bytes per part
+        parts_dir (str): Directory for the parts, defaults to the archive's directory
+
+    Returns:
+        str: Path to the .parts.json manifest
+    """
+    parts_dir = parts_dir or os.path.dirname(archive_path) or "."
+    manifest = plan_parts(archive_path, part_size)
+    for part in manifest["parts"]:
+        with open(os.path.join(parts_dir, part["name"]), "wb") as dst:
+            for chunk in _read_range(archive_path, part["offset"], part["size"]):
+                dst.write(chunk)
+
+    manifest_path = os.path.join(parts_dir, manifest["archive"] + PARTS_SUFFIX)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_parts(manifest_path):
+    """
+    Check that every part listed in a .parts.json manifest is present and intact
+
+    Returns:
+        list: Problems found, empty if all parts are good
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    parts_dir = os.path.dirname(manifest_path) or "."
+    problems = []
+    for part in manifest["parts"]:
+        path = os.path.join(parts_dir, part["name"])
+        if not os.path.exists(path):
+            problems.append(f"{part['name']} is missing")
+        elif os.path.getsize(path) != part["size"]:
+            problems.append(f"{part['name']} is {os.path.getsize(path)} bytes, expected {part['size']}")
+        elif _hash_file(path) != part["sha256"]:
+            problems.append(f"{part['name']} has a bad checksum")
+    return problems
+
+
+def reassemble(manifest_path, output_path=None):
+    """
+    Join the parts of a split archive back together and verify the result
+
+    Args:
+        manifest_path (str): Path to the .parts.json manifest, with the parts next to it
+        output_path (str): Where to write the archive, defaults to the original name next to the parts
+
+    Returns:
+        str: Path to the reassembled archive
+
+    Raises:
+        ValueError: If a part is missing or corrupt, or the joined file does not match
+    """
+    problems = verify_parts(manifest_path)
+    if problems:
+        raise ValueError("Cannot reassemble: " + "; ".join(problems))
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    parts_dir = os.path.dirname(manifest_path) or "."
+    output_path = output_path or os.path.join(parts_dir, manifest["archive"])
+    temp_path = output_path + ".partial"
+    digest = hashlib.sha256()
+
+    try:
+        with open(temp_path, "wb") as dst:
+            for part in manifest["parts"]:
+                with open(os.path.join(parts_dir, part["name"]), "rb") as src:
+                    for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+                        dst.write(chunk)
+                        digest.update(chunk)
+        if digest.hexdigest() != manifest["sha256"]:
+            raise ValueError(f"Reassembled {manifest['archive']} does not match its checksum")
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+class BackupUploader:
+    def __init__(self, bot, part_size=PART_SIZE, max_concurrent=3, attempts=3, split=True):
+        """
+        Initialize the BackupUploader class.
+
+        Args:
+            bot: Hikari bot instance
+            part_size (int): Largest attachment to send, bigger archives are split
+            max_concurrent (int): Parts uploaded at the same time
+            attempts (int): Tries per part before giving up
+            split (bool): Split archives over `part_size`; when False they are refused as before
+        """
+        self.bot = bot
+        self.part_size = min(part_size, DISCORD_LIMIT)
+        self.max_concurrent = max_concurrent
+        self.attempts = attempts
+        self.split = split
+
+    async def _send_file(self, channel_id, path, content, semaphore, part=None):
+        """
+        Upload one file, retrying transient failures (hikari already waits out 429s)
+
+        Args:
+            part (dict): Manifest entry; only its byte range of `path` is sent, under its own name
+        """
+        name = part["name"] if part else os.path.basename(path)
+        async with semaphore:
+            for attempt in range(1, self.attempts + 1):
+                if part is None:
+                    attachment = hikari.File(path)
+                else:
+                    # A fresh reader per attempt, since a failed upload may have consumed some of it
+                    attachment = hikari.Bytes(self._stream_range(path, part["offset"], part["size"]), part["name"])
+                try:
+                    await self.bot.rest.create_message(channel_id, content, attachment=attachment)
+                    return True
+                except (hikari.InternalServerError, hikari.HTTPError, OSError, asyncio.TimeoutError) as e:
+                    print(f"Upload of {name} failed (attempt {attempt}/{self.attempts}): {e}")
+                    if attempt < self.attempts:
+                        await asyncio.sleep(2 ** attempt)
+            return False
+
+    @staticmethod
+    async def _stream_range(path, offset, size):
+        # Disk reads run on a worker thread so the upload doesn't block the event loop
+        chunks = _read_range(path, offset, size)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    async def send(self, channel_id, archive_path, content):
+        """
+        Send a backup archive to a channel, in parts if it is over the limit
+
+        Args:
+            channel_id (int): Channel to send to
+            archive_path (str): Archive to send
+            content (str): Message text for the archive
+
+        Returns:
+            bool: True if the archive (or every part of it) was uploaded
+        """
+        size = os.path.getsize(archive_path)
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        if size <= self.part_size:
+            return await self._send_file(channel_id, archive_path, content, semaphore)
+
+        if not self.split:
+            await self.bot.rest.create_message(
+                channel_id,
+                f"Backup file is too large ({size / (1024 * 1024):.2f}MB) to send directly."
+            )
+            return False
+
+        manifest = await asyncio.to_thread(plan_parts, archive_path, self.part_size)
+        parts = manifest["parts"]
+
+        await self.bot.rest.create_message(
+            channel_id,
+            f"{content}\n{manifest['archive']} is {size / (1024 * 1024):.2f}MB, sending it in {len(parts)} parts "
+            f"(sha256 {manifest['sha256'][:16]}…). Download every part with this manifest and run "
+            f"`python backup_upload.py reassemble {manifest['archive']}{PARTS_SUFFIX}` to restore it.",
+            attachment=hikari.Bytes(json.dumps(manifest, indent=2).encode(), manifest["archive"] + PARTS_SUFFIX)
+        )
+        results = await asyncio.gather(*(
+            self._send_file(
+                channel_id,
+                archive_path,
+                f"Part {index}/{len(parts)} of {manifest['archive']} (sha256 {part['sha256'][:16]}…)",
+                semaphore,
+                part
+            )
+            for index, part in enumerate(parts, 1)
+        ))
+        failed = [part["name"] for part, ok in zip(parts, results) if not ok]
+        if failed:
+            await self.bot.rest.create_message(
+                channel_id,
+                f"⚠️ {len(failed)} of {len(parts)} backup parts failed to upload: {', '.join(failed)}"
+            )
+            return False
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split or reassemble backup archives")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split", help="Split an archive into parts")
+    split_parser.add_argument("archive")
+    split_parser.add_argument("--part-mb", type=int, default=PART_SIZE // (1024 * 1024))
+    join_parser = subparsers.add_parser("reassemble", help="Verify and join the parts of an archive")
+    join_parser.add_argument("manifest")
+    join_parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        print(split_archive(args.archive, args.part_mb * 1024 * 1024))
+    else:
+        print(reassemble(args.manifest, args.output))
@@ -0,0 +1,75 @@
+"""
+Compare archive codecs by size ratio and wall time.
+
+Builds the same synthetic website tree as bench_backup.py and archives it
+locally with every available codec. Tar codecs run once on a single thread
+and once on all cores to show the block-parallel speedup.
+
+    python bench_codecs.py --dirs 40 --files 100
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import archive_codecs
+from bench_backup import build_tree
+
+CODECS = [
+    "zip-store",
+    "zip-deflate:1",
+    "zip-deflate:6",
+    "zip-deflate:9",
+    "tar.gz:1",
+    "tar.gz:6",
+    "tar.zst:3",
+    "tar.zst:9",
+    "tar.lz4",
+]
+
+
+def archive_tree(tree, path, codec, workers):
+    with archive_codecs.ArchiveWriter(path, codec, workers) as writer:
+        for root, _, files in os.walk(tree):
+            for name in files:
+                file_path = os.path.join(root, name)
+                writer.add_file(file_path, os.path.relpath(file_path, tree).replace(os.sep, "/"))
+
+
+def main(args):
+    tree = tempfile.mkdtemp(prefix="bench_site_")
+    output = tempfile.mkdtemp(prefix="bench_codecs_")
+    cores = os.cpu_count() or 1
+    available = archive_codecs.available_codecs()
+    try:
+        build_tree(tree, args.dirs, args.files)
+        # Everything under the tree is archived here, including the dirs a backup would exclude
+        source_bytes = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(tree) for name in files)
+        print(f"Source: {source_bytes / (1024 * 1024):.1f} MB, {cores} cores")
+        print(f"{'codec':<16}{'threads':>8}{'size MB':>10}{'ratio':>8}{'seconds':>9}{'MB/s':>9}")
+        for codec in CODECS:
+            family = codec.partition(":")[0]
+            if family not in available:
+                print(f"{codec:<16}  skipped (package not installed)")
+                continue
+            thread_counts = [1, cores] if family.startswith("tar.") and cores > 1 else [1]
+            for workers in thread_counts:
+                path = os.path.join(output, f"bench{archive_codecs.codec_extension(codec)}")
+                start = time.perf_counter()
+                archive_tree(tree, path, codec, workers)
+                elapsed = time.perf_counter() - start
+                size = os.path.getsize(path)
+                print(f"{codec:<16}{workers:>8}{size / (1024 * 1024):>10.2f}{size / source_bytes:>8.3f}"
+                      f"{elapsed:>9.2f}{source_bytes / (1024 * 1024) / elapsed:>9.1f}")
+                os.remove(path)
+    finally:
+        shutil.rmtree(tree, ignore_errors=True)
+        shutil.rmtree(output, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=40, help="Number of directories")
+    parser.add_argument("--files", type=int, default=100, help="Files per directory")
+    main(parser.parse_args())
@@ -0,0 +1,337 @@
+"""
+Benchmark the monitor, backup and patch paths against local stand-ins.
+
+Nothing touches the network: thousands of ports are opened on 127.0.0.1
+(standins.PortStandIn), /submit-transaction is served by standins.APIStandIn
+with adjustable latency and failure rate, and backups and patches run over
+the paramiko SSH/SFTP stand-in against a synthetic website tree. Every
+scenario reports throughput and latency percentiles.
+
+Results can be saved as a baseline and later runs compared against it; a
+metric that got worse by more than --tolerance is reported as a regression
+and the exit status is 1, so the suite can gate a deployment.
+
+    python benchmark.py --save-baseline baselines/local.json
+    python benchmark.py --compare baselines/local.json --tolerance 0.25
+    python benchmark.py --scenarios check_all_ports monitor_ports --ports 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from alerts import AlertDispatcher
+from backup import Backup
+from bench_backup import build_tree
+from diagnostics import Diagnostics
+from latency import percentile
+from monitor import ServerMonitor
+from patch_rules import PatchRule
+from patch_update import PatchUpdate
+from ssh_pool import SSHPool
+from standins import APIStandIn, BotStandIn, PortStandIn, SSHStandIn
+
+SCENARIOS = ("check_all_ports", "monitor_ports", "create_backup", "modify_file")
+
+# Timing metrics closer together than this are noise, whatever the tolerance says
+NOISE_FLOOR_MS = 2.0
+
+
+def latency_summary(seconds, prefix):
+    """p50/p95/p99/max of a list of durations in seconds, as milliseconds"""
+    values = sorted(seconds)
+    if not values:
+        return {}
+    return {
+        f"{prefix}_p50_ms": percentile(values, 0.50) * 1000,
+        f"{prefix}_p95_ms": percentile(values, 0.95) * 1000,
+        f"{prefix}_p99_ms": percentile(values, 0.99) * 1000,
+        f"{prefix}_max_ms": values[-1] * 1000,
+    }
+
+
+def probe_latencies(monitor, targets):
+    latencies = []
+    for target in targets:
+        ring = monitor.latency.rings.get(target)
+        if ring is not None:
+            latencies.extend(ring.latencies())
+    return latencies
+
+
+async def bench_check_all_ports(args, ports, api):
+    """On-demand status checks, as /ping does when its snapshot is stale"""
+    api.failure_rate = 0.0
+    monitor = ServerMonitor("127.0.0.1", ports.ports, api_endpoint=api.url, port_services={})
+    rounds = []
+    up = 0
+    try:
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            result = await monitor.check_all_ports(timeout=args.timeout)
+            rounds.append(time.perf_counter() - start)
+            up = result["up_ports"]
+    finally:
+        await monitor.close()
+    probes = args.rounds * (len(ports.ports) + 1)
+    # ports_up counts the API too, so it should be --ports + 1; less means probes are timing out
+    results = {"probes_per_s": probes / sum(rounds), "ports_up": up}
+    results.update(latency_summary(rounds, "round"))
+    results.update(latency_summary(probe_latencies(monitor, ports.open_ports), "port_probe"))
+    results.update(latency_summary(probe_latencies(monitor, ["api"]), "api_probe"))
+    return results
+
+
+async def bench_monitor_ports(args, ports, api):
+    """The background monitor loop with flap damping, alerts and a flaky API"""
+    api.failure_rate = args.monitor_api_failure_rate
+    bot = BotStandIn()
+    alerts = AlertDispatcher(bot, 1, rate=100, burst=100, coalesce_window=0.5)
+    monitor = ServerMonitor(
+        "127.0.0.1", ports.ports, check_interval=args.interval, port_services={},
+        api_endpoint=api.url, alerts=alerts, reprobe_delay=max(1, args.interval / 2)
+    )
+    diagnostics = Diagnostics(lag_interval=0.05, lag_window=100000)
+    diagnostics.start()
+    task = asyncio.create_task(monitor.monitor_ports(bot, 1))
+    start = time.perf_counter()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await diagnostics.stop()
+        await alerts.close()
+        await monitor.close()
+        api.failure_rate = 0.0
+    probes = sum(len(ring) for ring in monitor.latency.rings.values())
+    results = {"probes_per_s": probes / elapsed, "alerts_sent": len(bot.messages)}
+    results.update(latency_summary(probe_latencies(monitor, ports.open_ports), "port_probe"))
+    results.update(latency_summary(probe_latencies(monitor, ["api"]), "api_probe"))
+    results.update(latency_summary(list(diagnostics.lag_samples), "loop_lag"))
+    return results
+
+
+def bench_create_backup(args, server, tree, workdir):
+    """Full backups of the synthetic tree over SFTP, sharing one pooled connection"""
+    pool = SSHPool("127.0.0.1", server.port, "bench", None)
+    runs = []
+    files = size = 0
+    try:
+        for run in range(args.backup_runs):
+            # Separate directories, so two runs in the same second can't collide on the archive name
+            backup = Backup(
+                backup_dir=os.path.join(workdir, f"backups_{run}"),
+                ssh_host="127.0.0.1", ssh_port=server.port, ssh_username="bench",
+                remote_dir=tree, mode=args.backup_mode, ssh_pool=pool
+            )
+            start = time.perf_counter()
+            backup_path = backup.create_backup()
+            runs.append(time.perf_counter() - start)
+            if not backup_path:
+                raise RuntimeError("create_backup failed")
+            files = len(backup.load_manifest(backup_path)["files"])
+            size = os.path.getsize(backup_path)
+            backup.catalog.close()
+    finally:
+        pool.close()
+    mean = sum(runs) / len(runs)
+    results = {"files_per_s": files / mean, "mb_per_s": size / (1024 * 1024) / mean, "files": files}
+    results.update(latency_summary(runs, "backup"))
+    return results
+
+
+def add_patch_targets(tree, count, dirs):
+    """Templates that still call the old /transaction endpoint"""
+    for i in range(count):
+        directory = os.path.join(tree, "templates", f"section_{i % max(1, dirs)}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"form_{i}.html"), "w") as f:
+            f.write(f"<form id='tx-{i}'></form>\n<script>fetch('/transaction', {{method: 'POST'}})</script>\n" * 20)
+    with open(os.path.join(tree, "app.py"), "w") as f:
+        f.write("@app.route('/transaction', methods=['POST'])\ndef submit():\n    return {'hash': '0'}\n")
+
+
+def bench_modify_file(args, server, tree):
+    """Cold patch runs (every target changed), warm reruns (all skipped) and rollbacks"""
+    pool = SSHPool("127.0.0.1", server.port, "bench", None)
+    rules = [PatchRule("bench endpoint", ["app.py", "templates/**/*.html"],
+                       literal="/transaction", replace="/submit-transaction")]
+    patch = PatchUpdate(ssh_host="127.0.0.1", ssh_port=server.port, ssh_username="bench",
+                        remote_dir=tree, ssh_pool=pool, rules=rules)
+    cold, warm, rollback = [], [], []
+    changed = 0
+    try:
+        for _ in range(args.patch_runs):
+            for timings, call in ((cold, patch.modify_file), (warm, patch.modify_file), (rollback, patch.rollback)):
+                start = time.perf_counter()
+                result = call()
+                timings.append(time.perf_counter() - start)
+                if result is None or result is False:
+                    raise RuntimeError(f"{call.__name__} failed")
+                if timings is cold:
+                    changed = len(patch.last_report["changed"])
+    finally:
+        pool.close()
+        shutil.rmtree(patch.backup_root, ignore_errors=True)
+    results = {"files_changed": changed, "patched_files_per_s": changed / (sum(cold) / len(cold))}
+    results.update(latency_summary(cold, "cold_patch"))
+    results.update(latency_summary(warm, "warm_patch"))
+    results.update(latency_summary(rollback, "rollback"))
+    return results
+
+
+async def run_network_scenarios(args, scenarios):
+    results = {}
+    ports = PortStandIn(listening=args.ports, closed=args.closed)
+    api = APIStandIn(latency=args.api_latency, jitter=args.api_jitter, failure_rate=0.0)
+    try:
+        if "check_all_ports" in scenarios:
+            results["check_all_ports"] = await bench_check_all_ports(args, ports, api)
+        if "monitor_ports" in scenarios:
+            results["monitor_ports"] = await bench_monitor_ports(args, ports, api)
+    finally:
+        api.close()
+        ports.close()
+    return results
+
+
+def run_ssh_scenarios(args, scenarios):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    tree = os.path.join(workdir, "site")
+    server = SSHStandIn("/")
+    os.environ["SSH_KEY"] = server.client_key_data
+    try:
+        build_tree(tree, args.dirs, args.files)
+        add_patch_targets(tree, args.patch_files, args.dirs)
+        if "create_backup" in scenarios:
+            results["create_backup"] = bench_create_backup(args, server, tree, workdir)
+        if "modify_file" in scenarios:
+            results["modify_file"] = bench_modify_file(args, server, tree)
+    finally:
+        server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(baseline, results, tolerance):
+    """
+    Compare results with a saved baseline
+
+    Metrics ending in _per_s regress when they drop by more than `tolerance`,
+    percentiles ending in _ms when they grow by more than `tolerance` (and by
+    more than NOISE_FLOOR_MS). Maxima are a single sample and, like counts,
+    are only shown.
+
+    Returns:
+        list: (scenario, metric, baseline value, current value) of every regression
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        previous = baseline.get("results", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            before = previous.get(metric)
+            if before is None:
+                continue
+            if metric.endswith("_per_s"):
+                worse = value < before * (1 - tolerance)
+            elif metric.endswith("_ms") and not metric.endswith("_max_ms"):
+                worse = value > before * (1 + tolerance) and value - before > NOISE_FLOOR_MS
+            else:
+                worse = False
+            if worse:
+                regressions.append((scenario, metric, before, value))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for scenario, metrics in results.items():
+        print(f"\n{scenario}")
+        previous = (baseline or {}).get("results", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            line = f"  {metric:>24}: {value:12.2f}"
+            before = previous.get(metric)
+            if before:
+                line += f"   baseline {before:12.2f} ({(value - before) / before:+.1%})"
+            print(line)
+
+
+def main(args):
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    scenarios = args.scenarios
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    print(f"Scenarios: {', '.join(scenarios)}")
+    print(f"Stand-ins: {args.ports} open + {args.closed} closed ports, API {args.api_latency * 1000:.0f} ms "
+          f"+ up to {args.api_jitter * 1000:.0f} ms, site of {args.dirs * args.files + args.patch_files} files")
+    results = {}
+    # The code under test prints a line per state change and file; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        if {"check_all_ports", "monitor_ports"} & set(scenarios):
+            results.update(asyncio.run(run_network_scenarios(args, scenarios)))
+        if {"create_backup", "modify_file"} & set(scenarios):
+            results.update(run_ssh_scenarios(args, scenarios))
+    results = {scenario: results[scenario] for scenario in scenarios if scenario in results}
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "args": {key: value for key, value in vars(args).items() if key not in ("compare", "save_baseline")},
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if baseline:
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+            for scenario, metric, before, value in regressions:
+                print(f"  {scenario}.{metric}: {before:.2f} -> {value:.2f}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS,
+                        help="Scenarios to run")
+    parser.add_argument("--ports", type=int, default=2000, help="Listening ports")
+    parser.add_argument("--closed", type=int, default=200, help="Closed ports")
+    parser.add_argument("--timeout", type=float, default=1, help="Probe timeout for check_all_ports")
+    parser.add_argument("--rounds", type=int, default=20, help="check_all_ports rounds")
+    parser.add_argument("--api-latency", type=float, default=0.005, help="API stand-in base latency in seconds")
+    parser.add_argument("--api-jitter", type=float, default=0.005, help="API stand-in extra random latency")
+    parser.add_argument("--monitor-api-failure-rate", type=float, default=0.2,
+                        help="Share of failing API requests while monitor_ports runs")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds monitor_ports runs")
+    parser.add_argument("--interval", type=float, default=2, help="monitor_ports check interval in seconds")
+    parser.add_argument("--dirs", type=int, default=20, help="Directories in the synthetic site")
+    parser.add_argument("--files", type=int, default=50, help="Files per directory")
+    parser.add_argument("--backup-runs", type=int, default=3, help="create_backup runs")
+    parser.add_argument("--backup-mode", default="stream", help="Backup engine: stream, tempdir, parallel or tar")
+    parser.add_argument("--patch-files", type=int, default=200, help="Templates the patch rules change")
+    parser.add_argument("--patch-runs", type=int, default=3, help="modify_file cold/warm/rollback cycles")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    sys.exit(main(parser.parse_args()))
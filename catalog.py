@@ -0,0 +1,177 @@
+import datetime
+import sqlite3
+import threading
+
+
+class BackupCatalog:
+    def __init__(self, db_path="backups/catalog.db"):
+        """
+        Initialize the BackupCatalog class.
+
+        One SQLite row per archive with its size, checksum, file count and how
+        long it took, plus the archives each incremental still takes files
+        from. Listing and retention work from this index, so they only touch
+        the retained rows instead of stat'ing the whole backup directory.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS backups (
+                    archive TEXT PRIMARY KEY,
+                    created REAL NOT NULL,
+                    kind TEXT NOT NULL,
+                    base TEXT,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT,
+                    file_count INTEGER NOT NULL,
+                    duration REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS backups_created ON backups (created)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS requires (
+                    archive TEXT NOT NULL,
+                    required TEXT NOT NULL,
+                    PRIMARY KEY (archive, required)
+                ) WITHOUT ROWID
+            """)
+
+    def add(self, archive, created, kind, size, file_count, sha256=None, duration=None,
+            base=None, requires=()):
+        """
+        Record a finished backup
+
+        Args:
+            archive (str): Archive file name
+            created (float): Unix time the backup was taken
+            kind (str): "full" or "incremental"
+            size (int): Archive size in bytes
+            file_count (int): Files in the backup's snapshot
+            sha256 (str): Checksum of the archive file
+            duration (float): Seconds the backup took
+            base (str): Archive an incremental was taken against
+            requires (iterable): Other archives the snapshot takes files from
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (archive, created, kind, base, size, sha256, file_count, duration)
+            )
+            self._conn.execute("DELETE FROM requires WHERE archive = ?", (archive,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO requires VALUES (?, ?)",
+                [(archive, required) for required in requires if required != archive]
+            )
+
+    def remove(self, archive):
+        """Forget an archive"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM backups WHERE archive = ?", (archive,))
+            self._conn.execute("DELETE FROM requires WHERE archive = ?", (archive,))
+
+    def backups(self, limit=None, offset=0):
+        """
+        List backups, newest first
+
+        Returns:
+            list: sqlite3.Row objects with the columns of the backups table
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM backups ORDER BY created DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+
+    def get(self, archive):
+        """
+        Look up one backup
+
+        Returns:
+            sqlite3.Row: The backup's row, or None if it is not in the catalog
+        """
+        with self._lock:
+            return self._conn.execute("SELECT * FROM backups WHERE archive = ?", (archive,)).fetchone()
+
+    def latest(self):
+        """
+        Newest backup in the catalog
+
+        Returns:
+            sqlite3.Row: The newest backup, or None if the catalog is empty
+        """
+        rows = self.backups(limit=1)
+        return rows[0] if rows else None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM backups").fetchone()[0]
+
+    def _requirements(self):
+        with self._lock:
+            pairs = self._conn.execute("SELECT archive, required FROM requires").fetchall()
+        requirements = {}
+        for archive, required in pairs:
+            requirements.setdefault(archive, set()).add(required)
+        return requirements
+
+    def retention(self, keep_last=7, keep_daily=7, keep_weekly=4, keep_monthly=12):
+        """
+        Grandfather-father-son retention plan
+
+        The newest backup of each of the last `keep_daily` days, `keep_weekly`
+        ISO weeks and `keep_monthly` months that have backups is kept, plus
+        the `keep_last` newest overall. Archives a kept incremental still
+        takes files from are kept as well.
+
+        Returns:
+            tuple: (dict of archive -> reasons it is kept, list of archives to prune)
+        """
+        rows = self.backups()
+        keep = {}
+        rules = (
+            ("daily", keep_daily, lambda d: d.date()),
+            ("weekly", keep_weekly, lambda d: d.isocalendar()[:2]),
+            ("monthly", keep_monthly, lambda d: (d.year, d.month)),
+        )
+        for index, row in enumerate(rows):
+            if index < keep_last:
+                keep.setdefault(row["archive"], []).append("last")
+
+        for label, limit, period in rules:
+            seen = set()
+            for row in rows:
+                if len(seen) >= limit:
+                    break
+                bucket = period(datetime.datetime.fromtimestamp(row["created"]))
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.setdefault(row["archive"], []).append(label)
+
+        # Keep whatever the retained snapshots still need
+        requirements = self._requirements()
+        stack = list(keep)
+        while stack:
+            for required in requirements.get(stack.pop(), ()):
+                if required not in keep:
+                    keep[required] = ["base"]
+                    stack.append(required)
+                elif "base" not in keep[required]:
+                    keep[required].append("base")
+
+        prune = [row["archive"] for row in rows if row["archive"] not in keep]
+        return keep, prune
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
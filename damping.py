@@ -0,0 +1,81 @@
+from collections import deque
+
+
+class FlapDamper:
+    def __init__(self, fail_threshold=2, window=3, recover_threshold=2):
+        """
+        Initialize the FlapDamper class.
+
+        Turns raw probe results into confirmed UP/DOWN states. A target that is
+        UP only goes DOWN after `fail_threshold` failures within the last
+        `window` probes, and a target that is DOWN only comes back UP after
+        `recover_threshold` successes in a row. One dropped SYN therefore no
+        longer pages anyone.
+
+        Args:
+            fail_threshold (int): Failures (k) needed within the window to confirm DOWN
+            window (int): Number of recent probes (n) considered for DOWN
+            recover_threshold (int): Consecutive successes (m) needed to confirm UP
+        """
+        self.fail_threshold = max(1, fail_threshold)
+        self.window = max(self.fail_threshold, window)
+        self.recover_threshold = max(1, recover_threshold)
+        self.states = {}
+        self._recent = {}
+        self._successes = {}
+
+    def observe(self, target, ok):
+        """
+        Feed one raw probe result
+
+        Args:
+            target: Target identifier (port number, "api", ...)
+            ok (bool): Raw probe result
+
+        Returns:
+            bool: The confirmed state after this probe
+        """
+        recent = self._recent.get(target)
+        if recent is None:
+            recent = self._recent[target] = deque(maxlen=self.window)
+        recent.append(bool(ok))
+        self._successes[target] = self._successes.get(target, 0) + 1 if ok else 0
+
+        state = self.states.get(target)
+        if state is None:
+            # First probe - nothing to confirm against yet
+            state = bool(ok)
+        elif state and recent.count(False) >= self.fail_threshold:
+            state = False
+            self._successes[target] = 0
+        elif not state and self._successes[target] >= self.recover_threshold:
+            state = True
+            # Failures from before the recovery must not count towards the next outage
+            recent.clear()
+        self.states[target] = state
+        return state
+
+    def is_pending(self, target):
+        """
+        Whether the latest raw result disagrees with the confirmed state,
+        i.e. a transition has started but is not confirmed yet.
+        """
+        recent = self._recent.get(target)
+        state = self.states.get(target)
+        if not recent or state is None:
+            return False
+        return recent[-1] != state
+
+    def force(self, target, state):
+        """
+        Set a confirmed state directly, e.g. after recovery was verified some other way
+
+        Args:
+            target: Target identifier (port number, "api", ...)
+            state (bool): The state to confirm
+        """
+        self.states[target] = bool(state)
+        self._successes[target] = self.recover_threshold if state else 0
+        recent = self._recent.get(target)
+        if recent is not None:
+            recent.clear()
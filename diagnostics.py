@@ -0,0 +1,375 @@
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from latency import LatencyTracker
+from metrics import REGISTRY, LATENCY_BUCKETS, DURATION_BUCKETS
+
+LOOP_LAG = REGISTRY.histogram("event_loop_lag_seconds", "How late the event loop woke up a sleeping task")
+SLOW_CALLBACKS = REGISTRY.counter("slow_callbacks", "Times the event loop was blocked past the slow-callback threshold")
+COMMAND_SECONDS = REGISTRY.histogram("command_duration_seconds", "Slash command wall time", ("command",),
+                                     buckets=tuple(sorted(set(LATENCY_BUCKETS + DURATION_BUCKETS))))
+
+# Leaf frames of threads that are just waiting; left out of the profile summary
+IDLE_FRAMES = {
+    "selectors.py:select",
+    "threading.py:wait",
+    "queue.py:get",
+    "thread.py:_worker",
+}
+
+
+class Span:
+    def __init__(self, name):
+        """
+        Initialize the Span class.
+
+        Times one command from start to finish, split into named phases.
+
+        Args:
+            name (str): Command name
+        """
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.duration = None
+        self.error = None
+        self.phases = []
+        self._last = self.started
+
+    def mark(self, phase):
+        """Close the current phase: it covers the time since the last mark"""
+        now = time.monotonic()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    async def to_thread(self, phase, func, *args, **kwargs):
+        """
+        asyncio.to_thread, recording the time spent waiting for a free executor
+        worker separately from the time the function ran
+
+        Args:
+            phase (str): Phase name for the run time; the wait is "<phase> queued"
+        """
+        self.mark("before " + phase)
+        submitted = time.monotonic()
+        started = []
+
+        def call():
+            started.append(time.monotonic())
+            return func(*args, **kwargs)
+
+        try:
+            return await asyncio.to_thread(call)
+        finally:
+            now = time.monotonic()
+            begun = started[0] if started else now
+            self.phases.append((phase + " queued", begun - submitted))
+            self.phases.append((phase, now - begun))
+            self._last = now
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started
+
+    def describe(self):
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases
+                           if seconds >= 0.0005 or not phase.startswith("before "))
+        text = f"/{self.name} {self.duration * 1000:.0f}ms"
+        if phases:
+            text += f" ({phases})"
+        if self.error:
+            text += f" failed: {self.error}"
+        return text
+
+
+class Diagnostics:
+    def __init__(self, lag_interval=0.5, lag_window=20, slow_callback=0.25, max_events=20,
+                 max_spans=50, profile_interval=0.01, profile_dir="diagnostics"):
+        """
+        Initialize the Diagnostics class.
+
+        A task on the event loop wakes up every `lag_interval` seconds and
+        records how late it was. A watchdog thread watches those wake-ups;
+        when the loop has not come round for `slow_callback` seconds it
+        captures the loop thread's stack, which shows the call blocking it.
+
+        Args:
+            lag_interval (float): Seconds between loop lag samples
+            lag_window (int): Recent lag samples kept for reports and /healthz
+            slow_callback (float): Seconds the loop may be blocked before its stack is captured
+            max_events (int): Slow-callback events kept
+            max_spans (int): Finished command spans kept
+            profile_interval (float): Seconds between stack samples while profiling
+            profile_dir (str): Directory folded-stack profiles are written to
+        """
+        self.lag_interval = lag_interval
+        self.slow_callback = slow_callback
+        self.profile_interval = profile_interval
+        self.profile_dir = profile_dir
+        self.lag_samples = deque(maxlen=lag_window)
+        self.slow_events = deque(maxlen=max_events)
+        self.spans = deque(maxlen=max_spans)
+        self.commands = LatencyTracker(capacity=256)
+        self.last_profile = None
+        self._loop = None
+        self._loop_thread = None
+        self._beat = None
+        self._stall_beat = None
+        self._lag_task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+        self._profile_thread = None
+        self._profile_stop = None
+
+    def start(self):
+        """Start sampling on the running event loop; does nothing if already started"""
+        if self._lag_task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._lag_task = asyncio.create_task(self._sample_loop_lag())
+        self._watchdog = threading.Thread(target=self._watch, name="diagnostics-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._profile_thread:
+            await asyncio.to_thread(self.stop_profile)
+
+    async def _sample_loop_lag(self):
+        # A sleep that wakes up late means something held the loop for that long
+        while True:
+            self._beat = start = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.monotonic() - start - self.lag_interval)
+            self.lag_samples.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def loop_lag(self):
+        """Worst loop lag among the recent samples, None before the first one"""
+        return max(self.lag_samples) if self.lag_samples else None
+
+    def _watch(self):
+        while not self._stop.wait(self.slow_callback / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.lag_interval
+            if blocked <= self.slow_callback:
+                continue
+            if self._stall_beat == beat:
+                # Same stall as last time: only its length has changed
+                self.slow_events[-1]["blocked"] = blocked
+                continue
+            self._stall_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self._loop) if self._loop else None
+            self.slow_events.append({
+                "at": time.time(),
+                "blocked": blocked,
+                "task": task.get_name() if task else None,
+                "stack": traceback.format_stack(frame) if frame else [],
+            })
+            SLOW_CALLBACKS.inc()
+            print(f"Event loop blocked for over {blocked:.2f}s in {self._where(self.slow_events[-1])}")
+
+    @staticmethod
+    def _where(event):
+        # The innermost frame of the captured stack is the blocking call
+        if not event["stack"]:
+            return "unknown code"
+        return event["stack"][-1].strip().splitlines()[0]
+
+    def executor_stats(self):
+        """
+        Load on the default executor used by asyncio.to_thread
+
+        Returns:
+            dict: Worker threads started, busy and allowed, and work items waiting for a worker
+        """
+        executor = getattr(self._loop, "_default_executor", None) if self._loop else None
+        if executor is None:
+            # Created on first use
+            return {"threads": 0, "busy": 0, "max_workers": None, "queued": 0}
+        threads = len(getattr(executor, "_threads", ()))
+        idle = getattr(getattr(executor, "_idle_semaphore", None), "_value", 0)
+        return {
+            "threads": threads,
+            "busy": max(0, threads - idle),
+            "max_workers": getattr(executor, "_max_workers", None),
+            "queued": executor._work_queue.qsize() if hasattr(executor, "_work_queue") else 0,
+        }
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """
+        Time a command; yields a Span whose mark() and to_thread() record phases
+
+        Args:
+            name (str): Command name
+        """
+        span = Span(name)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.finish()
+            self.spans.append(span)
+            self.commands.record(name, span.duration, span.error is None)
+            COMMAND_SECONDS.observe(span.duration, name)
+
+    @property
+    def profiling(self):
+        return self._profile_thread is not None
+
+    def start_profile(self, seconds=None):
+        """
+        Start sampling every thread's stack in the background
+
+        Args:
+            seconds (float): Stop by itself after this long, None to run until stop_profile()
+
+        Returns:
+            bool: False if a profile is already running
+        """
+        if self._profile_thread:
+            return False
+        self._profile_stop = threading.Event()
+        self._profile_thread = threading.Thread(
+            target=self._profile, args=(seconds, self._profile_stop), name="diagnostics-profiler", daemon=True
+        )
+        self._profile_thread.start()
+        return True
+
+    def stop_profile(self):
+        """
+        Stop the running profile and wait for its summary
+
+        Returns:
+            dict: See last_profile, or None if no profile was running
+        """
+        thread = self._profile_thread
+        if not thread:
+            return None
+        self._profile_stop.set()
+        thread.join()
+        return self.last_profile
+
+    def _profile(self, seconds, stop):
+        own = threading.get_ident()
+        started = time.monotonic()
+        deadline = started + seconds if seconds else None
+        stacks = Counter()
+        samples = 0
+        while not stop.wait(self.profile_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[tuple(reversed(stack))] += 1
+            samples += 1
+            if deadline and time.monotonic() >= deadline:
+                break
+        self.last_profile = self._summarize_profile(stacks, samples, time.monotonic() - started)
+        self._profile_thread = None
+
+    def _summarize_profile(self, stacks, samples, duration):
+        path = None
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.folded")
+            # Folded stacks, one per line: the input format of flamegraph.pl and speedscope
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(";".join(stack) + f" {count}\n")
+        except OSError as e:
+            print(f"Could not write profile: {e}")
+            path = None
+
+        # Where threads that were doing something spent their time
+        leaves = Counter()
+        for stack, count in stacks.items():
+            if stack[-1] not in IDLE_FRAMES:
+                leaves[stack[-1]] += count
+        active = sum(leaves.values())
+        return {
+            "samples": samples,
+            "seconds": duration,
+            "path": path,
+            "top": [(frame, count / active) for frame, count in leaves.most_common(10)],
+        }
+
+    def report(self):
+        """
+        Everything the diagnostics know, for the debug endpoint
+
+        Returns:
+            dict: Loop lag, executor load, slow callbacks, command timings and profiler state
+        """
+        commands = {}
+        for name in self.commands.rings:
+            commands[name] = self.commands.stats(name)
+        return {
+            "loop_lag": self.loop_lag(),
+            "loop_lag_samples": list(self.lag_samples),
+            "executor": self.executor_stats(),
+            "slow_callbacks": list(self.slow_events),
+            "commands": commands,
+            "recent_spans": [span.describe() for span in self.spans],
+            "profiling": self.profiling,
+            "last_profile": self.last_profile,
+        }
+
+    def report_lines(self, spans=5):
+        """
+        Short summary for a Discord message
+
+        Returns:
+            list: Formatted lines
+        """
+        lag = self.loop_lag()
+        executor = self.executor_stats()
+        lines = [
+            f"Loop lag: {lag * 1000:.1f} ms worst of last {len(self.lag_samples)} samples" if lag is not None
+            else "Loop lag: no samples yet",
+            f"Executor: {executor['busy']}/{executor['max_workers'] or '?'} workers busy, "
+            f"{executor['queued']} queued",
+            f"Slow callbacks: {len(self.slow_events)} recorded",
+        ]
+        for event in list(self.slow_events)[-3:][::-1]:
+            when = time.strftime("%H:%M:%S", time.localtime(event["at"]))
+            lines.append(f"`{when}` blocked {event['blocked']:.2f}s in {self._where(event)}")
+        for name in sorted(self.commands.rings):
+            stats = self.commands.stats(name)
+            if stats["p50"] is not None:
+                lines.append(f"/{name}: p50 {stats['p50'] * 1000:.0f} ms / p95 {stats['p95'] * 1000:.0f} ms "
+                             f"over {stats['count']} runs")
+        for span in list(self.spans)[-spans:][::-1]:
+            lines.append(span.describe())
+        if self.profiling:
+            lines.append("Profiler: running")
+        elif self.last_profile:
+            lines.extend(self.profile_lines(self.last_profile))
+        return lines
+
+    @staticmethod
+    def profile_lines(profile):
+        lines = [f"Last profile: {profile['samples']} samples over {profile['seconds']:.1f}s"
+                 + (f", saved to {profile['path']}" if profile["path"] else "")]
+        for frame, share in profile["top"][:5]:
+            lines.append(f"{share:.0%} of busy samples in {frame}")
+        return lines
@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import time
+from probe import ProbeEngine
+from alerts import AlertDispatcher
+from scheduling import AdaptiveSchedule
+
+
+class FleetMonitor:
+    def __init__(self, targets=None, check_interval=60, max_in_flight=200, timeout=2,
+                 port_services=None, probe_engine=None, alerts=None):
+        """
+        Initialize the FleetMonitor class.
+
+        A single probe loop covers every (host, port) pair. Targets are kept in a
+        heap ordered by their next due time, so the loop only ever wakes up for the
+        probe that is due next, and a semaphore caps how many probes are in flight.
+        Due times come from an AdaptiveSchedule: first probes are spread across the
+        interval, down targets are probed more often and long-stable ones less.
+
+        Args:
+            targets (list): List of (host, port) tuples to monitor
+            check_interval (int): How often to check a healthy target in seconds
+            max_in_flight (int): Maximum number of probes running at once
+            timeout (int): Connection timeout for each probe in seconds
+            port_services (dict): Dictionary mapping ports to service names
+            probe_engine (ProbeEngine): Engine used for port probes
+            alerts (AlertDispatcher): Queue that delivers alert messages off the probe loop
+        """
+        self.check_interval = check_interval
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.port_services = port_services or {
+            22: "SSH",
+            80: "HTTP Website",
+            443: "HTTPS Website",
+        }
+        self.probe_engine = probe_engine or ProbeEngine(max_concurrency=max_in_flight)
+        self.alerts = alerts
+        self.schedule = AdaptiveSchedule(
+            base_interval=check_interval,
+            min_interval=max(5, check_interval / 4),
+            max_interval=check_interval * 3
+        )
+        self.states = {}
+        self._due = {}
+        self._schedule = []
+        self._sequence = 0
+        self._wakeup = None
+        for host, port in targets or []:
+            self.add_target(host, port)
+
+    def add_target(self, host, port, due=None):
+        """
+        Add a (host, port) target to the schedule.
+
+        Args:
+            host (str): Hostname or IP address
+            port (int): Port to probe
+            due (float): Monotonic time of the first probe, defaults to a random
+                         point within the next check interval
+        """
+        key = (host, int(port))
+        if key in self.states:
+            return
+        self.states[key] = None
+        first = self.schedule.add(key, time.monotonic())
+        self._push(key, first if due is None else due)
+
+    def remove_target(self, host, port):
+        """Stop monitoring a (host, port) target"""
+        # The heap entry is dropped lazily when it comes due
+        self.states.pop((host, int(port)), None)
+        self._due.pop((host, int(port)), None)
+        self.schedule.remove((host, int(port)))
+
+    def _push(self, key, due):
+        self._due[key] = due
+        self._sequence += 1
+        heapq.heappush(self._schedule, (due, self._sequence, key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def service_name(self, key):
+        host, port = key
+        return f"{self.port_services.get(port, f'Port {port}')} on {host}"
+
+    async def check_target(self, host, port, timeout=None):
+        """Check if a port on a host is open"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await self.probe_engine.check(host, port, timeout)
+        except Exception as e:
+            print(f"Error checking {host}:{port}: {e}")
+            return False
+
+    async def _probe(self, key, semaphore, bot, channel_id):
+        host, port = key
+        try:
+            is_up = await self.check_target(host, port)
+            await self._update_state(key, is_up, bot, channel_id)
+        except Exception as e:
+            print(f"Error in fleet probe for {host}:{port}: {e}")
+        finally:
+            semaphore.release()
+            if key in self.states:
+                self._push(key, self.schedule.next(key, time.monotonic(), is_up=self.states[key]))
+
+    async def _notify(self, bot, channel_id, content):
+        """Queue an alert on the dispatcher, or send it directly if there is none"""
+        if self.alerts:
+            self.alerts.send(content)
+        else:
+            await bot.rest.create_message(channel_id, content=content)
+
+    async def _update_state(self, key, is_up, bot, channel_id):
+        if key not in self.states:
+            return
+        previous = self.states[key]
+        self.states[key] = is_up
+        service_name = self.service_name(key)
+
+        if previous is None:
+            print(f"{service_name} initial state: {'UP' if is_up else 'DOWN'}")
+        elif previous and not is_up:
+            print(f"ALERT: {service_name} went DOWN!")
+            await self._notify(bot, channel_id, f"@everyone ⚠️ {service_name} is DOWN!")
+        elif not previous and is_up:
+            print(f"{service_name} recovered and is now UP")
+            await self._notify(bot, channel_id, f"{service_name} is back online")
+
+    async def run(self, bot, channel_id):
+        """
+        Continuously probe every target and send alerts to the specified channel
+
+        Args:
+            bot: Hikari bot instance
+            channel_id (int): Channel ID to send alerts to
+        """
+        print(f"Starting fleet monitoring for {len(self.states)} targets "
+              f"(max {self.max_in_flight} probes in flight)")
+        if self.alerts is None:
+            self.alerts = AlertDispatcher(bot, channel_id)
+        self.alerts.start()
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._wakeup = asyncio.Event()
+        probes = set()
+
+        while True:
+            if not self._schedule:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, _, key = self._schedule[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                # Sleep until the next probe is due, or a new target is added
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._schedule)
+            if self._due.get(key) != due:
+                # Target was removed or rescheduled since this entry was pushed
+                continue
+
+            # Blocks while max_in_flight probes are already running
+            await semaphore.acquire()
+            task = asyncio.create_task(self._probe(key, semaphore, bot, channel_id))
+            probes.add(task)
+            task.add_done_callback(probes.discard)
+
+    def summary(self):
+        """
+        Summarize the current fleet state
+
+        Returns:
+            dict: Counts of targets that are up, down and not yet checked
+        """
+        up = sum(1 for state in self.states.values() if state)
+        down = sum(1 for state in self.states.values() if state is False)
+        return {
+            "total": len(self.states),
+            "up": up,
+            "down": down,
+            "pending": len(self.states) - up - down,
+            "down_targets": [key for key, state in self.states.items() if state is False],
+        }
@@ -0,0 +1,199 @@
+import math
+import sqlite3
+import threading
+import time
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+
+class HistoryStore:
+    def __init__(self, db_path="monitor_history.db", raw_retention_days=2,
+                 minute_retention_days=35, hour_retention_days=400):
+        """
+        Initialize the HistoryStore class.
+
+        Raw probe results go into a SQLite table. The same batch also updates
+        per-minute and per-hour aggregates, so long-range queries read a few
+        hundred rollup rows instead of scanning raw samples. Old raw and minute
+        rows are pruned once they are covered by the coarser rollups.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+            raw_retention_days (int): Days of raw samples to keep
+            minute_retention_days (int): Days of per-minute aggregates to keep
+            hour_retention_days (int): Days of per-hour aggregates to keep
+        """
+        self.db_path = db_path
+        self.raw_retention = raw_retention_days * DAY
+        self.minute_retention = minute_retention_days * DAY
+        self.hour_retention = hour_retention_days * DAY
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_prune = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    target TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    ok INTEGER NOT NULL,
+                    latency REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS samples_target_ts ON samples (target, ts)")
+            for table in ("rollup_minute", "rollup_hour"):
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        target TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+                        ok_count INTEGER NOT NULL,
+                        latency_sum REAL NOT NULL,
+                        latency_max REAL NOT NULL,
+                        PRIMARY KEY (target, bucket)
+                    ) WITHOUT ROWID
+                """)
+
+    def record(self, target, ok, latency, timestamp=None):
+        """
+        Buffer one probe result, written on the next flush()
+
+        Args:
+            target (str): Target identifier, e.g. "1.2.3.4:443"
+            ok (bool): Whether the probe succeeded
+            latency (float): Probe latency in seconds
+            timestamp (float): Wall-clock time of the probe, defaults to now
+        """
+        self._buffer.append((target, time.time() if timestamp is None else timestamp,
+                             1 if ok else 0, latency))
+
+    def flush(self):
+        """
+        Write all buffered results in one transaction and update the rollups.
+        Blocking, so call it through asyncio.to_thread from the event loop.
+
+        Returns:
+            int: Number of samples written
+        """
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+
+        minute = self._aggregate(rows, MINUTE)
+        hour = self._aggregate(rows, HOUR)
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?)", rows)
+                    self._upsert("rollup_minute", minute)
+                    self._upsert("rollup_hour", hour)
+            except sqlite3.Error as e:
+                print(f"Error writing monitor history: {e}")
+                return 0
+
+            if time.time() - self._last_prune > HOUR:
+                self._prune()
+        return len(rows)
+
+    def _aggregate(self, rows, bucket_size):
+        """Pre-aggregate a batch in Python so each bucket is one upsert"""
+        buckets = {}
+        for target, ts, ok, latency in rows:
+            key = (target, int(ts // bucket_size) * bucket_size)
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = [1, ok, latency, latency]
+            else:
+                entry[0] += 1
+                entry[1] += ok
+                entry[2] += latency
+                entry[3] = max(entry[3], latency)
+        return [(target, bucket, *values) for (target, bucket), values in buckets.items()]
+
+    def _upsert(self, table, aggregates):
+        self._conn.executemany(f"""
+            INSERT INTO {table} (target, bucket, count, ok_count, latency_sum, latency_max)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (target, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                ok_count = ok_count + excluded.ok_count,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_max = MAX(latency_max, excluded.latency_max)
+        """, aggregates)
+
+    def _prune(self):
+        """Drop raw and minute rows that the coarser rollups already cover"""
+        now = time.time()
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_retention,))
+                self._conn.execute("DELETE FROM rollup_minute WHERE bucket < ?", (now - self.minute_retention,))
+                self._conn.execute("DELETE FROM rollup_hour WHERE bucket < ?", (now - self.hour_retention,))
+            self._last_prune = now
+        except sqlite3.Error as e:
+            print(f"Error pruning monitor history: {e}")
+
+    def _sum_rollup(self, table, target, start, end):
+        row = self._conn.execute(f"""
+            SELECT COALESCE(SUM(count), 0), COALESCE(SUM(ok_count), 0),
+                   COALESCE(SUM(latency_sum), 0), COALESCE(MAX(latency_max), 0)
+            FROM {table} WHERE target = ? AND bucket >= ? AND bucket < ?
+        """, (target, start, end)).fetchone()
+        return row
+
+    def uptime(self, target, window=30 * DAY, now=None):
+        """
+        Uptime and latency for a target over a time window, read from rollups only.
+
+        Whole hours come from the hourly table; the partial hours at either
+        edge come from the minute table.
+
+        Args:
+            target (str): Target identifier
+            window (float): Window size in seconds
+            now (float): End of the window, defaults to now
+
+        Returns:
+            dict: Probe count, successful count, uptime ratio (None without data),
+                  mean and max latency in seconds
+        """
+        end = time.time() if now is None else now
+        start = end - window
+        start_minute = int(start // MINUTE) * MINUTE
+        end_minute = int(math.ceil(end / MINUTE)) * MINUTE
+        first_hour = int(math.ceil(start_minute / HOUR)) * HOUR
+        last_hour = int(end_minute // HOUR) * HOUR
+
+        with self._lock:
+            if first_hour < last_hour:
+                parts = [
+                    self._sum_rollup("rollup_minute", target, start_minute, first_hour),
+                    self._sum_rollup("rollup_hour", target, first_hour, last_hour),
+                    self._sum_rollup("rollup_minute", target, last_hour, end_minute),
+                ]
+            else:
+                parts = [self._sum_rollup("rollup_minute", target, start_minute, end_minute)]
+
+        count = sum(part[0] for part in parts)
+        ok_count = sum(part[1] for part in parts)
+        latency_sum = sum(part[2] for part in parts)
+        return {
+            "count": count,
+            "ok_count": ok_count,
+            "uptime": ok_count / count if count else None,
+            "latency_mean": latency_sum / count if count else None,
+            "latency_max": max(part[3] for part in parts),
+        }
+
+    def close(self):
+        """Flush pending results and close the database"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
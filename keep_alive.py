@@ -1,16 +1,160 @@
-from flask import Flask
-from threading import Thread
+import asyncio
+import hmac
+import time
+from aiohttp import web
+import metrics
+from diagnostics import Diagnostics
 
-app = Flask("")
 
+class KeepAliveServer:
+    def __init__(self, bot, monitor=None, host="0.0.0.0", port=4399, diagnostics=None,
+                 max_loop_lag=1.0, max_round_age=None, debug_token=None):
+        """
+        Initialize the KeepAliveServer class.
 
-@app.route("/")
-def home():
-    return "Bot is running!"
+        Serves the keep-alive, health and metrics routes from an aiohttp
+        server on the bot's own event loop, so a stalled loop also stalls
+        /healthz instead of a separate thread answering "running".
 
-def run():
-    app.run(host="0.0.0.0", port=4399)
+        Args:
+            bot: Hikari bot instance whose gateway connection is reported
+            monitor (ServerMonitor): Monitor whose last completed probe round is reported
+            host (str): Interface to listen on
+            port (int): Port to listen on
+            diagnostics (Diagnostics): Loop lag sampler, started and stopped with the server
+            max_loop_lag (float): Loop lag in seconds above which the bot is unhealthy
+            max_round_age (float): Seconds without a completed monitor round before the bot is
+                                   unhealthy, defaults to 1.5x the monitor's longest probe interval
+            debug_token (str): Bearer token for the /debug routes; they answer 404 without one
+        """
+        self.bot = bot
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self.diagnostics = diagnostics or Diagnostics()
+        self.max_loop_lag = max_loop_lag
+        self.max_round_age = max_round_age
+        if self.max_round_age is None and monitor is not None:
+            self.max_round_age = monitor.schedule.max_interval * 1.5
+        self.debug_token = debug_token
+        self.started = None
+        self._runner = None
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
\ No newline at end of file
+        self.app = web.Application()
+        self.app.router.add_get("/", self.home)
+        self.app.router.add_get("/healthz", self.healthz)
+        self.app.router.add_get("/metrics", self.metrics_endpoint)
+        self.app.router.add_get("/debug", self.debug)
+        self.app.router.add_post("/debug/profile", self.debug_profile_start)
+        self.app.router.add_delete("/debug/profile", self.debug_profile_stop)
+
+    async def start(self):
+        """Start listening and sampling the event loop"""
+        if self._runner:
+            return
+        self.started = time.monotonic()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.diagnostics.start()
+        print(f"Keep-alive server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        await self.diagnostics.stop()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def gateway_status(self):
+        """
+        Connection state of the bot's gateway shards
+
+        Returns:
+            tuple: (True if every shard is connected, heartbeat latency in seconds or None)
+        """
+        shards = getattr(self.bot, "shards", None) or {}
+        connected = bool(shards) and all(shard.is_connected for shard in shards.values())
+        latency = getattr(self.bot, "heartbeat_latency", None)
+        if latency is not None and latency != latency:
+            # Hikari reports NaN until the first heartbeat is acknowledged
+            latency = None
+        return connected, latency
+
+    def health(self):
+        """
+        Liveness report for /healthz
+
+        Returns:
+            dict: Loop lag, monitor round age, gateway state, the problems found and whether the bot is healthy
+        """
+        now = time.monotonic()
+        problems = []
+
+        loop_lag = self.diagnostics.loop_lag()
+        if loop_lag is not None and loop_lag > self.max_loop_lag:
+            problems.append(f"event loop lag {loop_lag:.3f}s")
+
+        round_age = None
+        if self.monitor is not None:
+            last_round = self.monitor.last_round or self.started
+            round_age = now - last_round if last_round else None
+            if round_age is not None and self.max_round_age and round_age > self.max_round_age:
+                problems.append(f"no monitor round for {round_age:.0f}s")
+
+        connected, heartbeat = self.gateway_status()
+        if not connected:
+            problems.append("gateway disconnected")
+
+        return {
+            "healthy": not problems,
+            "problems": problems,
+            "loop_lag": loop_lag,
+            "last_round_age": round_age,
+            "gateway_connected": connected,
+            "heartbeat_latency": heartbeat,
+            "uptime": now - self.started if self.started else None,
+        }
+
+    async def home(self, request):
+        return web.Response(text="Bot is running!")
+
+    async def healthz(self, request):
+        report = self.health()
+        return web.json_response(report, status=200 if report["healthy"] else 503)
+
+    async def metrics_endpoint(self, request):
+        # Prometheus asks for OpenMetrics in its Accept header; anything else gets the plain text format
+        openmetrics = metrics.wants_openmetrics(request.headers.get("Accept"))
+        return web.Response(
+            body=metrics.REGISTRY.render(openmetrics).encode(),
+            headers={"Content-Type": metrics.OPENMETRICS_CONTENT_TYPE if openmetrics else metrics.TEXT_CONTENT_TYPE}
+        )
+
+    def _authorized(self, request):
+        if not self.debug_token:
+            return False
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return hmac.compare_digest(supplied.encode(), self.debug_token.encode())
+
+    async def debug(self, request):
+        if not self._authorized(request):
+            raise web.HTTPNotFound()
+        return web.json_response(self.diagnostics.report())
+
+    async def debug_profile_start(self, request):
+        if not self._authorized(request):
+            raise web.HTTPNotFound()
+        try:
+            seconds = float(request.query.get("seconds", "30"))
+        except ValueError:
+            raise web.HTTPBadRequest(text="seconds must be a number")
+        started = self.diagnostics.start_profile(seconds if seconds > 0 else None)
+        return web.json_response({"started": started, "seconds": seconds}, status=202 if started else 409)
+
+    async def debug_profile_stop(self, request):
+        if not self._authorized(request):
+            raise web.HTTPNotFound()
+        profile = await asyncio.to_thread(self.diagnostics.stop_profile)
+        if profile is None:
+            return web.json_response({"error": "no profile running"}, status=409)
+        return web.json_response(profile)
@@ -0,0 +1,126 @@
+import math
+import time
+from array import array
+
+
+class LatencyRing:
+    def __init__(self, capacity=1024):
+        """
+        Initialize the LatencyRing class.
+
+        Samples are stored in preallocated arrays that are overwritten in a
+        circle, so memory stays fixed no matter how long the bot runs.
+
+        Args:
+            capacity (int): Number of samples kept per target
+        """
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._latencies = array('d', bytes(8 * capacity))
+        self._ok = array('b', bytes(capacity))
+        self._index = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, latency, ok, timestamp=None):
+        """
+        Store one probe result, overwriting the oldest sample when full
+
+        Args:
+            latency (float): Probe latency in seconds
+            ok (bool): Whether the probe succeeded
+            timestamp (float): Wall-clock time of the probe, defaults to now
+        """
+        i = self._index
+        self._timestamps[i] = time.time() if timestamp is None else timestamp
+        self._latencies[i] = latency
+        self._ok[i] = 1 if ok else 0
+        self._index = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _window(self, window):
+        """Return (latencies of successful probes, total count, error count) within the window"""
+        cutoff = time.time() - window if window else None
+        latencies = []
+        total = 0
+        errors = 0
+        # Walk from newest to oldest so we can stop at the first sample outside the window
+        for step in range(1, self._count + 1):
+            i = (self._index - step) % self.capacity
+            if cutoff is not None and self._timestamps[i] < cutoff:
+                break
+            total += 1
+            if self._ok[i]:
+                latencies.append(self._latencies[i])
+            else:
+                errors += 1
+        return latencies, total, errors
+
+    def latencies(self, window=None):
+        """Latencies of the successful probes inside the window, newest first"""
+        return self._window(window)[0]
+
+    def stats(self, window=None, quantiles=(0.50, 0.95, 0.99)):
+        """
+        Summarize the samples inside a sliding window
+
+        Args:
+            window (float): Window size in seconds, None for every stored sample
+            quantiles (tuple): Quantiles to report
+
+        Returns:
+            dict: Sample count, error count, error rate and one pNN entry per quantile
+                  (latency of successful probes in seconds, None without data)
+        """
+        latencies, total, errors = self._window(window)
+        latencies.sort()
+        result = {
+            "count": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+        }
+        for quantile in quantiles:
+            result[f"p{round(quantile * 100)}"] = percentile(latencies, quantile)
+        return result
+
+
+def percentile(sorted_values, quantile):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(quantile * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    def __init__(self, capacity=1024):
+        """
+        Initialize the LatencyTracker class.
+
+        Args:
+            capacity (int): Number of samples kept per target
+        """
+        self.capacity = capacity
+        self.rings = {}
+
+    def record(self, target, latency, ok, timestamp=None):
+        """Store one probe result for a target"""
+        ring = self.rings.get(target)
+        if ring is None:
+            ring = self.rings[target] = LatencyRing(self.capacity)
+        ring.record(latency, ok, timestamp)
+
+    def stats(self, target, window=None):
+        """
+        Summarize one target over a sliding window
+
+        Returns:
+            dict: See LatencyRing.stats, or None if the target has no samples
+        """
+        ring = self.rings.get(target)
+        if ring is None:
+            return None
+        return ring.stats(window)
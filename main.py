@@ -4,15 +4,20 @@ from dotenv import load_dotenv
 import asyncio
 import hikari
 import time
-from keep_alive import keep_alive
+from keep_alive import KeepAliveServer
+from diagnostics import Diagnostics
 from backup import Backup
+from backup_upload import BackupUploader
 from monitor import ServerMonitor
+from fleet import FleetMonitor
+from history import HistoryStore
+from alerts import AlertDispatcher
 from patch_update import PatchUpdate
+from patch_rules import load_rules
+from ssh_pool import SSHPool
 import aiohttp
 load_dotenv()
 
-keep_alive()
-
 bot = lightbulb.BotApp(
     token=os.getenv("BOT_TOKEN"),
     prefix="!")
@@ -32,22 +37,49 @@ PORT_SERVICES = {
     443: "HTTPS Website",
 }
 
+# Backups, patches and restarts share warm SSH connections
+ssh_pool = SSHPool(
+    ssh_host=os.getenv("SSH_HOST", IP_TO_PING),  # Default to monitored IP if not specified
+    ssh_port=int(os.getenv("SSH_PORT", "22")),
+    ssh_username=os.getenv("SSH_USERNAME"),
+    ssh_key_passphrase=os.getenv("SSH_KEY_PASSPHRASE"),
+    max_size=int(os.getenv("SSH_POOL_SIZE", "4")),
+    idle_timeout=int(os.getenv("SSH_IDLE_TIMEOUT", "300"))
+)
+
 backup_system = Backup(
     backup_dir="backups",
-    max_backups=7, 
+    max_backups=7,  # Newest backups always kept, on top of the daily/weekly/monthly ones
+    keep_daily=int(os.getenv("BACKUP_KEEP_DAILY", "7")),
+    keep_weekly=int(os.getenv("BACKUP_KEEP_WEEKLY", "4")),
+    keep_monthly=int(os.getenv("BACKUP_KEEP_MONTHLY", "12")),
     ssh_host=os.getenv("SSH_HOST", IP_TO_PING),  # Default to monitored IP if not specified
     ssh_port=int(os.getenv("SSH_PORT", "22")),
     ssh_username=os.getenv("SSH_USERNAME"),
-    ssh_key_passphrase=os.getenv("SSH_KEY_PASSPHRASE")
+    ssh_key_passphrase=os.getenv("SSH_KEY_PASSPHRASE"),
+    codec=os.getenv("BACKUP_CODEC", "zip-deflate:6"),  # e.g. zip-store, tar.gz:6, tar.zst:3, tar.lz4
+    ssh_pool=ssh_pool
+)
+
+backup_uploader = BackupUploader(
+    bot,
+    part_size=int(os.getenv("BACKUP_PART_MB", "24")) * 1024 * 1024,  # Parts stay under Discord's 25MB limit
+    max_concurrent=int(os.getenv("BACKUP_UPLOAD_CONCURRENCY", "3")),
+    split=os.getenv("BACKUP_SPLIT", "true").lower() == "true"
 )
 
 patch_update = PatchUpdate(
     ssh_host=os.getenv("SSH_HOST", IP_TO_PING),
     ssh_port=int(os.getenv("SSH_PORT", "22")),
     ssh_username=os.getenv("SSH_USERNAME"),
-    ssh_key_passphrase=os.getenv("SSH_KEY_PASSPHRASE")
+    ssh_key_passphrase=os.getenv("SSH_KEY_PASSPHRASE"),
+    ssh_pool=ssh_pool,
+    rules=load_rules(os.getenv("PATCH_RULES", "patch_rules.json"))  # Falls back to the built-in endpoint fix
 )
 
+# Alerts from every monitor share one rate-limited, coalescing queue
+alert_dispatcher = AlertDispatcher(bot, PING_CHANNEL_ID)
+
 # Initialize server monitor
 server_monitor = ServerMonitor(
     ip_address=IP_TO_PING,
@@ -55,30 +87,82 @@ server_monitor = ServerMonitor(
     check_interval=CHECK_INTERVAL,
     port_services=PORT_SERVICES,
     api_endpoint="https://team08.csc429.io/submit-transaction",
-    patch = patch_update
+    patch = patch_update,
+    status_ttl=int(os.getenv("PING_CACHE_TTL", "90")),
+    history=HistoryStore(os.getenv("HISTORY_DB", "monitor_history.db")),
+    alerts=alert_dispatcher
+)
+
+# Optional fleet of extra hosts, e.g. FLEET_TARGETS="10.0.0.5:22,10.0.0.5:443,10.0.0.6:80"
+FLEET_TARGETS = [
+    (target.rsplit(":", 1)[0].strip(), int(target.rsplit(":", 1)[1]))
+    for target in os.getenv("FLEET_TARGETS", "").split(",") if ":" in target
+]
+
+fleet_monitor = FleetMonitor(
+    targets=FLEET_TARGETS,
+    check_interval=CHECK_INTERVAL,
+    max_in_flight=int(os.getenv("FLEET_MAX_IN_FLIGHT", "200")),
+    port_services=PORT_SERVICES,
+    alerts=alert_dispatcher
+)
+
+# Loop lag, blocked-loop stacks, executor load and command timings
+diagnostics = Diagnostics(slow_callback=float(os.getenv("SLOW_CALLBACK_SECONDS", "0.25")))
+
+# Keep-alive, /healthz, /metrics and /debug, served from the bot's own event loop
+keep_alive_server = KeepAliveServer(
+    bot,
+    monitor=server_monitor,
+    port=int(os.getenv("KEEP_ALIVE_PORT", "4399")),
+    diagnostics=diagnostics,
+    max_loop_lag=float(os.getenv("HEALTH_MAX_LOOP_LAG", "1.0")),
+    debug_token=os.getenv("DEBUG_TOKEN")  # /debug is disabled unless this is set
 )
 
+@bot.listen(hikari.StartingEvent)
+async def on_starting(_):
+    # Up before the gateway connects, so /healthz can report a bot that never connects
+    await keep_alive_server.start()
+
 @bot.listen(hikari.StartedEvent)
 async def on_start(_):
     # Start the monitoring task
     asyncio.create_task(server_monitor.monitor_ports(bot, PING_CHANNEL_ID))
+    # One probe loop covers the whole fleet
+    if FLEET_TARGETS:
+        asyncio.create_task(fleet_monitor.run(bot, PING_CHANNEL_ID))
+
+@bot.listen(hikari.StoppingEvent)
+async def on_stopping(_):
+    # Close pooled HTTP connections cleanly on shutdown
+    await keep_alive_server.stop()
+    await server_monitor.close()
+    await alert_dispatcher.close()
+    ssh_pool.close()
 
 @bot.command
 @lightbulb.command("ping", "checks status of all monitored ports")
 @lightbulb.implements(lightbulb.SlashCommand)
 async def ping(ctx: lightbulb.Context) -> None:
     try:
-        # IMMEDIATELY acknowledge the interaction before doing anything else
-        await ctx.respond("Checking port statuses...", flags=hikari.MessageFlag.EPHEMERAL)
-        
-        # Use the server monitor to check all ports
-        result = await server_monitor.check_all_ports(timeout=1)
-        
-        # Combine header and status messages
-        response = f"{result['header']}\n\n" + "\n".join(result['status_messages'])
-        
-        # Send the final response as a follow-up
-        await ctx.respond(response)
+        with diagnostics.span("ping") as span:
+            # Before the first snapshot exists a full check can outlast Discord's 3s deadline, so defer
+            if server_monitor.status_snapshot is None:
+                await ctx.respond(hikari.ResponseType.DEFERRED_MESSAGE_CREATE)
+                span.mark("defer")
+            
+            # Answer from the monitor's latest snapshot, refreshed in the background when stale
+            result = await server_monitor.get_status(timeout=1)
+            span.mark("status")
+            
+            # Combine header, status messages and snapshot age
+            response = f"{result['header']}\n\n" + "\n".join(result['status_messages'])
+            response += f"\n\n_Last checked {result['age']:.0f}s ago_"
+            
+            # Send the response
+            await ctx.respond(response)
+            span.mark("respond")
     except Exception as e:
         print(f"Error in ping command: {e}")
         # Try to send a message if possible
@@ -88,36 +172,178 @@ async def ping(ctx: lightbulb.Context) -> None:
             pass
 
 
+@bot.command
+@lightbulb.option("minutes", "Window size in minutes", type=int, required=False, default=15)
+@lightbulb.command("latency", "shows probe latency percentiles and error rates")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def latency(ctx: lightbulb.Context) -> None:
+    try:
+        minutes = ctx.options.minutes or 15
+        lines = server_monitor.latency_report(window=minutes * 60)
+        response = f"⏱️ Probe latency on {IP_TO_PING} (last {minutes} min)\n\n" + "\n".join(lines)
+        await ctx.respond(response, flags=hikari.MessageFlag.EPHEMERAL)
+    except Exception as e:
+        print(f"Error in latency command: {e}")
+        try:
+            await ctx.respond(f"An error occurred: {str(e)}")
+        except:
+            pass
+
+
+@bot.command
+@lightbulb.option("days", "Window size in days", type=int, required=False, default=30)
+@lightbulb.command("uptime", "shows uptime of all monitored services from stored history")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def uptime(ctx: lightbulb.Context) -> None:
+    try:
+        days = ctx.options.days or 30
+        lines = await asyncio.to_thread(server_monitor.uptime_report, days)
+        response = f"📈 Uptime on {IP_TO_PING} (last {days} days)\n\n" + "\n".join(lines)
+        await ctx.respond(response, flags=hikari.MessageFlag.EPHEMERAL)
+    except Exception as e:
+        print(f"Error in uptime command: {e}")
+        try:
+            await ctx.respond(f"An error occurred: {str(e)}")
+        except:
+            pass
+
+
+@bot.command
+@lightbulb.option("count", "Number of incidents to list", type=int, required=False, default=5)
+@lightbulb.command("recovery", "shows automatic recovery incidents and mean time to recovery")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def recovery(ctx: lightbulb.Context) -> None:
+    try:
+        count = max(1, min(ctx.options.count or 5, 20))
+        lines = server_monitor.remediation.report(count)
+        response = "🩺 Automatic recovery\n\n" + "\n".join(lines)
+        await ctx.respond(response, flags=hikari.MessageFlag.EPHEMERAL)
+    except Exception as e:
+        print(f"Error in recovery command: {e}")
+        try:
+            await ctx.respond(f"An error occurred: {str(e)}")
+        except:
+            pass
+
+
+@bot.command
+@lightbulb.add_checks(lightbulb.owner_only | lightbulb.has_guild_permissions(hikari.Permissions.ADMINISTRATOR))
+@lightbulb.option("seconds", "Profile length in seconds when starting one", type=int, required=False, default=30)
+@lightbulb.option("profile", "Start or stop a sampling profile", type=str, required=False, choices=["start", "stop"])
+@lightbulb.command("diagnostics", "shows event loop lag, slow callbacks, executor load and command timings (admin)")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def diagnostics_command(ctx: lightbulb.Context) -> None:
+    try:
+        if ctx.options.profile == "start":
+            seconds = max(1, min(ctx.options.seconds or 30, 600))
+            if diagnostics.start_profile(seconds):
+                response = f"🔬 Sampling profile started for {seconds}s"
+            else:
+                response = "A profile is already running"
+        elif ctx.options.profile == "stop":
+            profile = await asyncio.to_thread(diagnostics.stop_profile)
+            response = "\n".join(diagnostics.profile_lines(profile)) if profile else "No profile is running"
+        else:
+            response = "🩻 Diagnostics\n\n" + "\n".join(diagnostics.report_lines())
+        await ctx.respond(response[:2000], flags=hikari.MessageFlag.EPHEMERAL)
+    except Exception as e:
+        print(f"Error in diagnostics command: {e}")
+        try:
+            await ctx.respond(f"An error occurred: {str(e)}")
+        except:
+            pass
+
+
+@bot.command
+@lightbulb.option("count", "Number of backups to list", type=int, required=False, default=10)
+@lightbulb.command("backups", "lists stored backups from the backup catalog")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def backups(ctx: lightbulb.Context) -> None:
+    try:
+        count = max(1, min(ctx.options.count or 10, 20))  # Stay under Discord's message limit
+        lines = await asyncio.to_thread(backup_system.backup_report, count)
+        total = await asyncio.to_thread(backup_system.catalog.count)
+        if not lines:
+            await ctx.respond("No backups in the catalog yet.", flags=hikari.MessageFlag.EPHEMERAL)
+            return
+        response = f"🗄️ Newest {len(lines)} of {total} stored backups\n\n" + "\n".join(lines)
+        await ctx.respond(response, flags=hikari.MessageFlag.EPHEMERAL)
+    except Exception as e:
+        print(f"Error in backups command: {e}")
+        try:
+            await ctx.respond(f"An error occurred: {str(e)}")
+        except:
+            pass
+
+
+@bot.command
+@lightbulb.add_checks(lightbulb.owner_only | lightbulb.has_guild_permissions(hikari.Permissions.ADMINISTRATOR))
+@lightbulb.option("archive", "Backup file name from /backups, defaults to the newest", type=str, required=False)
+@lightbulb.command("restore", "Verify a backup and restore it to the server (admin)")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def restore(ctx: lightbulb.Context) -> None:
+    try:
+        archive = ctx.options.archive
+        if not archive:
+            latest = await asyncio.to_thread(backup_system.catalog.latest)
+            if latest is None:
+                await ctx.respond("No backups in the catalog yet.", flags=hikari.MessageFlag.EPHEMERAL)
+                return
+            archive = latest["archive"]
+        backup_path = os.path.join(backup_system.backup_dir, os.path.basename(archive))
+        if not os.path.exists(backup_path):
+            await ctx.respond(f"Backup {archive} not found.", flags=hikari.MessageFlag.EPHEMERAL)
+            return
+        
+        await ctx.respond(f"Verifying and restoring {os.path.basename(backup_path)}... This may take some time.")
+        stats = await asyncio.to_thread(backup_system.restore_backup, backup_path)
+        if stats:
+            await ctx.respond(
+                f"✅ Restored {stats['files']} files ({stats['bytes'] / (1024 * 1024):.1f}MB) in {stats['seconds']:.1f}s. "
+                f"Previous tree kept at `{stats['previous']}`."
+            )
+        else:
+            await ctx.respond("❌ Restore failed. Check server logs for details.")
+    except Exception as e:
+        print(f"Error in restore command: {e}")
+        try:
+            await ctx.respond(f"An error occurred during restore: {str(e)}")
+        except:
+            pass
+
+
 @bot.command
 @lightbulb.command("patch", "Run patch update to fix broken paths")
 @lightbulb.implements(lightbulb.SlashCommand)
 async def patch_command(ctx: lightbulb.Context) -> None:
     try:
-        # Acknowledge the interaction immediately
-        await ctx.respond("Running patch update... This may take a moment.", flags=hikari.MessageFlag.EPHEMERAL)
-        def run_patch():
-            try:
-                return patch_update.modify_file()
-            except Exception as e:
-                print(f"Error running patch update: {e}")
-                return False
-        success = await asyncio.to_thread(run_patch)
-        if success:
-            await ctx.respond("✅ Attempting Endpoint Patch!")
-            # Restart the service after successful patch
-            def restart_service():
+        with diagnostics.span("patch") as span:
+            # Acknowledge the interaction immediately
+            await ctx.respond("Running patch update... This may take a moment.", flags=hikari.MessageFlag.EPHEMERAL)
+            def run_patch():
                 try:
-                    return patch_update.restart_service()
+                    return patch_update.modify_file()
                 except Exception as e:
-                    print(f"Error restarting service: {e}")
+                    print(f"Error running patch update: {e}")
                     return False
-            restart_success = await asyncio.to_thread(restart_service)
-            if restart_success:
-                await ctx.respond("🔄 Service restarted successfully!")
+            success = await span.to_thread("patch", run_patch)
+            if success:
+                await ctx.respond("✅ Attempting Endpoint Patch!")
+                # Restart the service after successful patch
+                def restart_service():
+                    try:
+                        return patch_update.restart_service()
+                    except Exception as e:
+                        print(f"Error restarting service: {e}")
+                        return False
+                restart_success = await span.to_thread("restart", restart_service)
+                if restart_success:
+                    await ctx.respond("🔄 Service restarted successfully!")
+                else:
+                    await ctx.respond("⚠️ Patch completed but service restart failed.")
+                span.mark("respond")
             else:
-                await ctx.respond("⚠️ Patch completed but service restart failed.")
-        else:
-            await ctx.respond("❌ Patch update failed")
+                await ctx.respond("❌ Patch update failed")
 
     except Exception as e:
         print(f"Error in patch command: {e}")
@@ -127,61 +353,80 @@ async def patch_command(ctx: lightbulb.Context) -> None:
         except:
             pass
 
+@bot.command
+@lightbulb.add_checks(lightbulb.owner_only | lightbulb.has_guild_permissions(hikari.Permissions.ADMINISTRATOR))
+@lightbulb.command("rollback", "Undo the last patch update and restart the service (admin)")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def rollback_command(ctx: lightbulb.Context) -> None:
+    try:
+        await ctx.respond("Rolling back the last patch...", flags=hikari.MessageFlag.EPHEMERAL)
+        restored = await asyncio.to_thread(patch_update.rollback)
+        if restored is None:
+            await ctx.respond("❌ Rollback failed or there is no patch to roll back")
+            return
+        await ctx.respond(f"↩️ Restored {len(restored)} files: {', '.join(restored[:10])}")
+        restart_success = await asyncio.to_thread(patch_update.restart_service)
+        if restart_success:
+            await ctx.respond("🔄 Service restarted successfully!")
+        else:
+            await ctx.respond("⚠️ Rollback completed but service restart failed.")
+    except Exception as e:
+        print(f"Error in rollback command: {e}")
+        try:
+            await ctx.respond(f"An error occurred during rollback: {str(e)}")
+        except:
+            pass
+
 @bot.command
 @lightbulb.command("backup", "Create and send a backup of the website files")
 @lightbulb.implements(lightbulb.SlashCommand)
 async def backup_website(ctx: lightbulb.Context) -> None:
     """Create and send a backup of the website files"""
     try:
-        # Acknowledge the interaction immediately
-        await ctx.respond("Starting website backup process... This may take some time.", flags=hikari.MessageFlag.EPHEMERAL)
-        
-        # Get the backup channel
-        backup_channel = BACKUP_CHANNEL_ID if BACKUP_CHANNEL_ID else ctx.channel_id
-        
-        # Create a message in the backup channel
-        message = await bot.rest.create_message(
-            backup_channel,
-            f"Creating website backup, requested by {ctx.author.username}... Please wait."
-        )
+        with diagnostics.span("backup") as span:
+            # Acknowledge the interaction immediately
+            await ctx.respond("Starting website backup process... This may take some time.", flags=hikari.MessageFlag.EPHEMERAL)
         
-        # Run the backup in a non-blocking way
-        def create_backup():
-            try:
-                return backup_system.create_backup()
-            except Exception as e:
-                print(f"Error creating backup: {e}")
-                return None
+            # Get the backup channel
+            backup_channel = BACKUP_CHANNEL_ID if BACKUP_CHANNEL_ID else ctx.channel_id
         
-        # Run the CPU-intensive backup creation in a thread pool
-        backup_path = await asyncio.to_thread(create_backup)
-        
-        if not backup_path:
-            await bot.rest.create_message(
+            # Create a message in the backup channel
+            message = await bot.rest.create_message(
                 backup_channel,
-                f"Failed to create backup. Check server logs for details."
+                f"Creating website backup, requested by {ctx.author.username}... Please wait."
             )
-            return
         
-        # Check if file size is under Discord's limit (25MB)
-        file_size = os.path.getsize(backup_path) / (1024 * 1024)  # in MB
-        if file_size > 25:
-            await bot.rest.create_message(
-                backup_channel,
-                f"Backup file is too large ({file_size:.2f}MB) to send directly."
-            )
-            return
+            # Run the backup in a non-blocking way
+            def create_backup():
+                try:
+                    return backup_system.create_backup()
+                except Exception as e:
+                    print(f"Error creating backup: {e}")
+                    return None
+        
+            # Run the CPU-intensive backup creation in a thread pool
+            backup_path = await span.to_thread("create", create_backup)
         
-        # Send the backup file
-        with open(backup_path, "rb") as f:
-            await bot.rest.create_message(
+            if not backup_path:
+                await bot.rest.create_message(
+                    backup_channel,
+                    f"Failed to create backup. Check server logs for details."
+                )
+                return
+        
+            # Stream the backup file from disk, split into parts if it is over Discord's limit
+            sent = await backup_uploader.send(
                 backup_channel,
-                f"Website backup created on {time.strftime('%Y-%m-%d %H:%M:%S')}:",
-                attachment=hikari.Bytes(f.read(), f"website_backup_{time.strftime('%Y%m%d_%H%M%S')}.zip")
+                backup_path,
+                f"Website backup created on {time.strftime('%Y-%m-%d %H:%M:%S')}:"
             )
+            span.mark("upload")
+            if not sent:
+                await ctx.respond("Backup was created but could not be fully uploaded.", flags=hikari.MessageFlag.EPHEMERAL)
+                return
         
-        # Confirm completion
-        await ctx.respond("Backup completed successfully!", flags=hikari.MessageFlag.EPHEMERAL)
+            # Confirm completion
+            await ctx.respond("Backup completed successfully!", flags=hikari.MessageFlag.EPHEMERAL)
         
     except Exception as e:
         print(f"Error in backup command: {e}")
@@ -196,6 +441,8 @@ async def backup_website(ctx: lightbulb.Context) -> None:
 async def setup_scheduled_backups(_):
     # Schedule backups - for example, daily at midnight
     backup_interval_hours = int(os.getenv("BACKUP_INTERVAL_HOURS", "12"))  # Default to daily
+    incremental_backups = os.getenv("BACKUP_INCREMENTAL", "false").lower() == "true"
+    full_every = int(os.getenv("BACKUP_FULL_EVERY", "7"))  # Full backup after this many incrementals
     
     async def scheduled_backup():
         while True:
@@ -217,8 +464,11 @@ async def setup_scheduled_backups(_):
                     f"Running scheduled website backup..."
                 )
                 
-                # Create the backup
-                backup_path = await asyncio.to_thread(backup_system.create_backup)
+                # Create the backup, only fetching changed files if incremental backups are enabled
+                if incremental_backups:
+                    backup_path = await asyncio.to_thread(backup_system.create_incremental_backup, full_every)
+                else:
+                    backup_path = await asyncio.to_thread(backup_system.create_backup)
                 
                 if not backup_path:
                     await bot.rest.create_message(
@@ -227,22 +477,20 @@ async def setup_scheduled_backups(_):
                     )
                     continue
                 
-                # Check if file size is under Discord's limit (25MB)
-                file_size = os.path.getsize(backup_path) / (1024 * 1024)  # in MB
-                if file_size > 25:
+                # Read every entry back before relying on this backup
+                report = await asyncio.to_thread(backup_system.verify_backup, backup_path)
+                if not report["ok"]:
                     await bot.rest.create_message(
                         backup_channel,
-                        f"Scheduled backup file is too large ({file_size:.2f}MB) to send directly."
+                        f"⚠️ Scheduled backup failed verification: {'; '.join(report['problems'][:5])}"
                     )
-                    continue
                 
-                # Send the backup file
-                with open(backup_path, "rb") as f:
-                    await bot.rest.create_message(
-                        backup_channel,
-                        f"Scheduled website backup created on {time.strftime('%Y-%m-%d %H:%M:%S')}:",
-                        attachment=hikari.Bytes(f.read(), f"website_backup_{time.strftime('%Y%m%d_%H%M%S')}.zip")
-                    )
+                # Stream the backup file from disk, split into parts if it is over Discord's limit
+                await backup_uploader.send(
+                    backup_channel,
+                    backup_path,
+                    f"Scheduled website backup created on {time.strftime('%Y-%m-%d %H:%M:%S')}:"
+                )
                     
             except Exception as e:
                 print(f"Error during scheduled backup: {e}")
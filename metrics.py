@@ -0,0 +1,223 @@
+import bisect
+import math
+import threading
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast local port probe up to a slow API call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Seconds, for backups and patch runs
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Bytes, 64KB to 4GB
+SIZE_BUCKETS = tuple(65536 * 4 ** i for i in range(9))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Instrument:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        Initialize the instrument.
+
+        Every thread that records a value gets its own shard, which only that
+        thread ever writes to. Recording is therefore a plain dict update with
+        no lock, and a scrape adds up copies of all shards.
+
+        Args:
+            name (str): Metric family name, without the _total suffix for counters
+            documentation (str): Help text
+            labels (tuple): Label names; values are passed positionally when recording
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = self._local.values = {}
+            # list.append is atomic, so registering a new shard needs no lock either
+            self._shards.append(shard)
+        return shard
+
+    def _snapshot(self):
+        return [shard.copy() for shard in list(self._shards)]
+
+
+class Counter(_Instrument):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        """
+        Increase the counter
+
+        Args:
+            *labels: One value per label name, in order
+            amount (float): How much to add, must not be negative
+        """
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self):
+        """
+        Current totals
+
+        Returns:
+            dict: Label values tuple -> total
+        """
+        totals = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.values().items()):
+            yield "_total", labels, None, value
+
+
+class Histogram(_Instrument):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        """
+        Initialize the Histogram class.
+
+        Args:
+            name (str): Metric family name
+            documentation (str): Help text
+            labels (tuple): Label names
+            buckets (tuple): Upper bounds of the buckets; +Inf is added automatically
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value
+            *labels: One value per label name, in order
+        """
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts (the last one is +Inf), then sum and count
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def values(self):
+        """
+        Current bucket counts, sums and counts
+
+        Returns:
+            dict: Label values tuple -> (cumulative bucket counts, sum, count)
+        """
+        merged = {}
+        for shard in self._snapshot():
+            for labels, state in shard.items():
+                total = merged.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        result = {}
+        for labels, state in merged.items():
+            cumulative = []
+            running = 0
+            for count in state[:-2]:
+                running += count
+                cumulative.append(running)
+            result[labels] = (cumulative, state[-2], state[-1])
+        return result
+
+    def samples(self):
+        bounds = self.buckets + (math.inf,)
+        for labels, (cumulative, total, count) in sorted(self.values().items()):
+            for bound, value in zip(bounds, cumulative):
+                yield "_bucket", labels, ("le", "+Inf" if bound == math.inf else repr(float(bound))), value
+            yield "_count", labels, None, count
+            yield "_sum", labels, None, total
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="pingbot_"):
+        """
+        Initialize the MetricsRegistry class.
+
+        Args:
+            prefix (str): Prepended to every metric name
+        """
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Re-importing a module must not register its metrics twice
+            if type(existing) is not type(metric) or existing.labels != metric.labels:
+                raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self.prefix + name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self.prefix + name, documentation, labels, buckets))
+
+    def render(self, openmetrics=True):
+        """
+        Expose every metric in the OpenMetrics text format
+
+        Args:
+            openmetrics (bool): False renders the older Prometheus text format instead
+
+        Returns:
+            str: The exposition text
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            # The Prometheus text format names counter families with their _total suffix
+            family = metric.name if openmetrics or metric.kind != "counter" else metric.name + "_total"
+            lines.append(f"# HELP {family} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for suffix, labels, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labels, labels, extra)} "
+                             f"{_format_number(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def wants_openmetrics(accept_header):
+    """Whether a scraper's Accept header asks for OpenMetrics rather than the Prometheus text format"""
+    return "application/openmetrics-text" in (accept_header or "")
+
+
+# Shared by every module, served at /metrics by keep_alive.py
+REGISTRY = MetricsRegistry()
@@ -1,23 +1,52 @@
-import socket
 import asyncio
 import hikari
 import time
 import aiohttp
 import json
+from probe import ProbeEngine
+from latency import LatencyTracker
+from damping import FlapDamper
+from alerts import AlertDispatcher
+from scheduling import AdaptiveSchedule
+from remediation import RemediationPipeline
+from metrics import REGISTRY
+
+PROBES = REGISTRY.counter("probes", "Port and API probes by target and result", ("target", "result"))
+PROBE_SECONDS = REGISTRY.histogram("probe_duration_seconds", "Port and API probe latency", ("target",))
+STATE_CHANGES = REGISTRY.counter("state_changes", "Confirmed UP/DOWN transitions by target", ("target", "state"))
 
 
 class ServerMonitor:
     def __init__(self, ip_address, ports_to_monitor=None, check_interval=60, port_services=None,
-                api_endpoint=None, patch=None):
+                api_endpoint=None, patch=None, probe_engine=None,
+                http_pool_size=20, http_per_host=4, http_keepalive=75, latency_samples=1024,
+                history=None, fail_threshold=2, fail_window=3, recover_threshold=2, reprobe_delay=5,
+                alerts=None, status_ttl=90, remediation=None):
         """
         Initialize the ServerMonitor class.
         
         Args:
             ip_address (str): IP address to monitor
             ports_to_monitor (list): List of ports to monitor
-            check_interval (int): How often to check ports in seconds
+            check_interval (int): How often to check a healthy target in seconds
             port_services (dict): Dictionary mapping ports to service names
             api_endpoint (str): API endpoint to check
+            patch (PatchUpdate): Patch updater used for automatic recovery
+            probe_engine (ProbeEngine): Engine used for port probes
+            http_pool_size (int): Total connections kept by the shared HTTP session
+            http_per_host (int): Connections allowed per API host
+            http_keepalive (int): Seconds an idle HTTP connection stays open
+            latency_samples (int): Probe results kept per target for latency queries
+            history (HistoryStore): Durable store that probe results are written to
+            fail_threshold (int): Failed probes within fail_window needed before alerting DOWN
+            fail_window (int): Number of recent probes considered for DOWN
+            recover_threshold (int): Consecutive successful probes needed before alerting UP
+            reprobe_delay (int): Seconds between probes of a target that is down or whose state
+                                 is unconfirmed, None to keep the regular check_interval
+            alerts (AlertDispatcher): Queue that delivers alert messages off the probe loop
+            status_ttl (int): Seconds before a cached status snapshot is refreshed on request
+            remediation (RemediationPipeline): Patch/restart/readiness pipeline run when the API
+                                               goes down, built from `patch` if not given
         """
         self.ip_address = ip_address
         self.ports_to_monitor = ports_to_monitor or [22, 80, 443]
@@ -32,69 +61,137 @@ class ServerMonitor:
         self.api_state = None
         self.patch_update = patch
         self.patch_attempted = False
+        self.probe_engine = probe_engine or ProbeEngine()
+        self.http_pool_size = http_pool_size
+        self.http_per_host = http_per_host
+        self.http_keepalive = http_keepalive
+        self._session = None
+        self.latency = LatencyTracker(capacity=latency_samples)
+        self.history = history
+        self.damper = FlapDamper(fail_threshold, fail_window, recover_threshold)
+        self.reprobe_delay = reprobe_delay
+        self.schedule = AdaptiveSchedule(
+            base_interval=check_interval,
+            min_interval=reprobe_delay,
+            max_interval=check_interval * 3
+        )
+        self.alerts = alerts
+        self.status_ttl = status_ttl
+        self.status_snapshot = None
+        self._refresh_task = None
+        self._last_results = {}
+        # Monotonic time the last probe round finished, reported by /healthz
+        self.last_round = None
+        if remediation is None and patch is not None:
+            remediation = RemediationPipeline(patch, self._api_ready)
+        self.remediation = remediation
+        self._remediation_task = None
+
+    def _get_session(self):
+        """
+        Return the shared HTTP session, creating it on first use.
+
+        Connections stay open between checks, so a check reuses the pooled
+        TCP/TLS connection and cached DNS answer instead of paying a fresh
+        handshake every time.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.http_pool_size,
+                limit_per_host=self.http_per_host,
+                keepalive_timeout=self.http_keepalive,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session and flush pending history"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.history:
+            await asyncio.to_thread(self.history.close)
+
+    def history_key(self, target):
+        """Identifier used in the history store for a port or the API endpoint"""
+        if target == "api":
+            return self.api_endpoint
+        return f"{self.ip_address}:{target}"
+
+    def _record(self, target, latency, ok):
+        self.latency.record(target, latency, ok)
+        label = str(target)
+        PROBES.inc(label, "up" if ok else "down")
+        PROBE_SECONDS.observe(latency, label)
+        if self.history:
+            self.history.record(self.history_key(target), ok, latency)
 
     async def check_port(self, port, timeout=2):
         """Check if a specific port is open"""
+        start = time.perf_counter()
         try:
-            return await asyncio.to_thread(self._check_socket, port, timeout)
+            is_up = await self.probe_engine.check(self.ip_address, port, timeout)
         except Exception as e:
             print(f"Error checking port {port}: {e}")
-            return False
-
-    def _check_socket(self, port, timeout):
-        """Helper function to perform socket connection"""
-        try:
-            # Use context manager to ensure socket is always closed properly
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as socket_obj:
-                socket_obj.settimeout(timeout)
-                result = socket_obj.connect_ex((self.ip_address, port))
-                return result == 0  # Return True if connection succeeded
-        except socket.error as e:
-            print(f"Socket error on {self.ip_address}:{port} - {e}")
-            return False
-        except Exception as e:
-            print(f"Unexpected error checking {self.ip_address}:{port} - {e}")
-            return False
+            is_up = False
+        self._record(port, time.perf_counter() - start, is_up)
+        return is_up
 
     async def check_api_endpoint(self, timeout=5):
         """
-        Check if the API endpoint is responding properly
-        
+        Check the API endpoint and record its response latency
+
         Args:
             timeout (int): Request timeout in seconds
-            
+
         Returns:
             bool: True if API responds correctly, False otherwise
         """
         if not self.api_endpoint:
             return None
 
+        start = time.perf_counter()
+        is_up = await self._check_api_endpoint(timeout)
+        self._record("api", time.perf_counter() - start, is_up)
+        return is_up
+
+    async def _check_api_endpoint(self, timeout=5):
+        """
+        Check if the API endpoint is responding properly
+        
+        Args:
+            timeout (int): Request timeout in seconds
+            
+        Returns:
+            bool: True if API responds correctly, False otherwise
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_endpoint,
-                    json={"name": "test"},
-                    timeout=timeout
-                ) as response:
-                    # Check for successful status code (2xx)
-                    if 200 <= response.status < 300:
-                        try:
-                            # Try to parse response as JSON
-                            json_response = await response.json()
-
-                            # Verify the response contains the 'hash' field
-                            if 'hash' in json_response:
-                                return True
-                            else:
-                                print(f"API endpoint {self.api_endpoint} responded without required 'hash' field")
-                                return False
-                        except:
-                            # Response wasn't valid JSON
-                            print(f"API endpoint {self.api_endpoint} responded with non-JSON content")
+            session = self._get_session()
+            async with session.post(
+                self.api_endpoint,
+                json={"name": "test"},
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                # Check for successful status code (2xx)
+                if 200 <= response.status < 300:
+                    try:
+                        # Try to parse response as JSON
+                        json_response = await response.json()
+
+                        # Verify the response contains the 'hash' field
+                        if 'hash' in json_response:
+                            return True
+                        else:
+                            print(f"API endpoint {self.api_endpoint} responded without required 'hash' field")
                             return False
-                    else:
-                        print(f"API endpoint {self.api_endpoint} responded with status code {response.status}")
+                    except:
+                        # Response wasn't valid JSON
+                        print(f"API endpoint {self.api_endpoint} responded with non-JSON content")
                         return False
+                else:
+                    print(f"API endpoint {self.api_endpoint} responded with status code {response.status}")
+                    return False
         except asyncio.TimeoutError:
             print(f"API endpoint {self.api_endpoint} timed out after {timeout} seconds")
             return False
@@ -103,6 +200,132 @@ class ServerMonitor:
             return False
 
 
+    async def _notify(self, bot, channel_id, content):
+        """Queue an alert on the dispatcher, or send it directly if there is none"""
+        if self.alerts:
+            self.alerts.send(content)
+        else:
+            await bot.rest.create_message(channel_id, content=content)
+
+    async def _handle_port_result(self, bot, channel_id, port, raw_is_up):
+        """Feed one raw port probe result through flap damping and alert on confirmed changes"""
+        service_name = self.port_services.get(port, f"Port {port}")
+        is_up = self.damper.observe(port, raw_is_up)
+        if raw_is_up != is_up:
+            print(f"{service_name} probe {'succeeded' if raw_is_up else 'failed'}, waiting for confirmation")
+
+        # First check - initialize state
+        if self.port_states[port] is None:
+            self.port_states[port] = is_up
+            print(f"{service_name} initial state: {'UP' if is_up else 'DOWN'}")
+            return
+
+        # Alert on state change from up to down
+        if self.port_states[port] and not is_up:
+            print(f"ALERT: {service_name} went DOWN!")
+            await self._notify(bot, channel_id, f"@everyone ⚠️ {service_name} on {self.ip_address} is DOWN!")
+            self.port_states[port] = False
+            STATE_CHANGES.inc(str(port), "down")
+
+        # Log recovery
+        elif not self.port_states[port] and is_up:
+            print(f"{service_name} recovered and is now UP")
+            await self._notify(bot, channel_id, f"{service_name} on {self.ip_address} is back online")
+            self.port_states[port] = True
+            STATE_CHANGES.inc(str(port), "up")
+
+    async def _handle_api_result(self, bot, channel_id, raw_api_is_up):
+        """Feed one raw API check result through flap damping and alert on confirmed changes"""
+        api_is_up = self.damper.observe("api", raw_api_is_up)
+        if raw_api_is_up != api_is_up:
+            print(f"API endpoint check {'succeeded' if raw_api_is_up else 'failed'}, waiting for confirmation")
+
+        if self.api_state is None:
+            self.api_state = api_is_up
+            print(f"API endpoint initial state: {'UP' if api_is_up else 'DOWN'}")
+
+        # Alert on state change from up to down
+        elif self.api_state and not api_is_up:
+            print(f"ALERT: API endpoint went DOWN!")
+            await self._notify(bot, channel_id, f"@everyone ⚠️ API endpoint {self.api_endpoint} is DOWN!")
+            self.api_state = False
+            STATE_CHANGES.inc("api", "down")
+
+            # Patch, restart and wait for readiness in the background so port probes keep running
+            if self.remediation and not self.patch_attempted and not self.remediation.active:
+                print("Running automatic patch update due to API endpoint failure...")
+                self.patch_attempted = True
+                self._remediation_task = asyncio.create_task(self._remediate(bot, channel_id, time.time()))
+
+        # Log recovery
+        elif not self.api_state and api_is_up:
+            print(f"API endpoint recovered and is now UP")
+            # A running remediation reports the recovery itself, with its timings
+            if not (self.remediation and self.remediation.active):
+                await self._notify(bot, channel_id, f"API endpoint {self.api_endpoint} is back online")
+            self.api_state = True
+            self.patch_attempted = False
+            STATE_CHANGES.inc("api", "up")
+
+    async def _api_ready(self):
+        """
+        Readiness check used while remediating: one short API request
+
+        Polls are left out of the latency tracker, probe metrics and history,
+        which would otherwise count every not-ready-yet poll as downtime.
+        """
+        return await self._check_api_endpoint(timeout=2)
+
+    async def _remediate(self, bot, channel_id, detected_at):
+        """Run the remediation pipeline and mark the API up as soon as it is ready"""
+        incident = await self.remediation.run(
+            detected_at, notify=lambda content: self._notify(bot, channel_id, content)
+        )
+        print(f"Remediation finished: {incident['outcome']}")
+        if incident["recovered"]:
+            # Readiness was verified, so skip the usual run of confirming probes
+            self.damper.force("api", True)
+            # A regular probe may have confirmed the recovery first and already counted it
+            if not self.api_state:
+                self.api_state = True
+                STATE_CHANGES.inc("api", "up")
+            self.patch_attempted = False
+            self._update_snapshot({}, True)
+
+    async def _probe_round(self, bot, channel_id, ports, include_api):
+        """
+        Probe the given ports (and optionally the API) in parallel and handle the results
+
+        Returns:
+            tuple: Raw port results dict and raw API result (None if not checked)
+        """
+        tasks = {port: asyncio.create_task(self.check_port(port)) for port in ports}
+
+        # Add API endpoint check if configured
+        api_task = None
+        if include_api and self.api_endpoint:
+            api_task = asyncio.create_task(self.check_api_endpoint())
+
+        port_results = {}
+        for port, task in tasks.items():
+            try:
+                port_results[port] = await task
+                await self._handle_port_result(bot, channel_id, port, port_results[port])
+            except Exception as e:
+                service_name = self.port_services.get(port, f"Port {port}")
+                print(f"Error in monitor task for {service_name}: {e}")
+
+        # Check API endpoint if configured
+        api_result = None
+        if api_task:
+            try:
+                api_result = await api_task
+                await self._handle_api_result(bot, channel_id, api_result)
+            except Exception as e:
+                print(f"Error in API endpoint monitoring: {e}")
+
+        return port_results, api_result
+
     async def monitor_ports(self, bot, channel_id):
         """
         Continuously monitor ports and send alerts to the specified channel
@@ -115,126 +338,70 @@ class ServerMonitor:
         if self.api_endpoint:
             print(f"Also monitoring API endpoint: {self.api_endpoint}")
 
-        while True:
-            # Check all ports in parallel
-            tasks = {port: self.check_port(port) for port in self.ports_to_monitor}
-
-            # Add API endpoint check if configured
-            api_task = None
-            if self.api_endpoint:
-                api_task = self.check_api_endpoint()
-
-            # Wait for all checks to complete
-            for port, task in tasks.items():
-                service_name = self.port_services.get(port, f"Port {port}")
-                try:
-                    is_up = await task
-
-                    # First check - initialize state
-                    if self.port_states[port] is None:
-                        self.port_states[port] = is_up
-                        print(f"{service_name} initial state: {'UP' if is_up else 'DOWN'}")
-                        continue
-
-                    # Alert on state change from up to down
-                    if self.port_states[port] and not is_up:
-                        print(f"ALERT: {service_name} went DOWN!")
-                        await bot.rest.create_message(
-                            channel_id,
-                            content=f"@everyone ⚠️ {service_name} on {self.ip_address} is DOWN!"
-                        )
-                        self.port_states[port] = False
-
-                    # Log recovery
-                    elif not self.port_states[port] and is_up:
-                        print(f"{service_name} recovered and is now UP")
-                        await bot.rest.create_message(
-                            channel_id,
-                            content=f"{service_name} on {self.ip_address} is back online"
-                        )
-                        self.port_states[port] = True
-
-                except Exception as e:
-                    print(f"Error in monitor task for {service_name}: {e}")
+        # Alerts are delivered by a background task so Discord throttling never delays probes
+        if self.alerts is None:
+            self.alerts = AlertDispatcher(bot, channel_id)
+        self.alerts.start()
 
+        # Every target runs on its own fixed-rate, jittered clock, first slots spread over the whole interval
+        targets = list(self.ports_to_monitor) + (["api"] if self.api_endpoint else [])
+        now = time.monotonic()
+        for target in targets:
+            self.schedule.push(target, self.schedule.add(target, now))
+        last_flush = now
 
-            # Check API endpoint if configured
-            if api_task:
+        while True:
+            next_fire = self.schedule.next_fire()
+            if next_fire is None:
+                # Nothing configured to probe
+                await asyncio.sleep(self.check_interval)
+                continue
+            await asyncio.sleep(max(0, next_fire - time.monotonic()))
+            due = self.schedule.pop_due(time.monotonic())
+            if not due:
+                continue
+
+            port_results, api_result = await self._probe_round(
+                bot, channel_id, [target for target in due if target != "api"], include_api="api" in due
+            )
+            self._update_snapshot(port_results, api_result)
+            self.last_round = time.monotonic()
+
+            # Degraded or unconfirmed targets come back sooner, long-stable ones later
+            now = time.monotonic()
+            for target in due:
+                fire = self.schedule.next(
+                    target, now, is_up=self.damper.states.get(target), pending=self.damper.is_pending(target)
+                )
+                self.schedule.push(target, fire)
+
+            # Write probe results to the history store in batches
+            if self.history and now - last_flush >= self.check_interval:
+                last_flush = now
                 try:
-                    api_is_up = await api_task
-                    if self.api_state is None:
-                        self.api_state = api_is_up
-                        print(f"API endpoint initial state: {'UP' if api_is_up else 'DOWN'}")
-
-                    # Alert on state change from up to down
-                    elif self.api_state and not api_is_up:
-                        print(f"ALERT: API endpoint went DOWN!")
-                        await bot.rest.create_message(
-                            channel_id,
-                            content=f"@everyone ⚠️ API endpoint {self.api_endpoint} is DOWN!"
-                        )
-                        self.api_state = False
-
-                        # Run patch update automatically when API goes down
-                        if self.patch_update and not self.patch_attempted:
-                            print("Running automatic patch update due to API endpoint failure...")
-                            try:
-                                def run_patch():
-                                    self.patch_attempted = True
-                                    return self.patch_update.modify_file()
-                                success = await asyncio.to_thread(run_patch)
-                                if success:
-                                    print("Automatic patch update completed successfully")
-                                    await bot.rest.create_message(
-                                        channel_id,
-                                        content="🔧 Automatic patch update completed - restarting service..."
-                                    )
-
-                                    # Restart service after successful patch
-                                    def restart_service():
-                                        return self.patch_update.restart_service()
-                                    restart_success = await asyncio.to_thread(restart_service)
-                                    if restart_success:
-                                        print("Service restart completed successfully")
-                                        await bot.rest.create_message(
-                                            channel_id,
-                                            content="🔄 Service restarted successfully"
-                                        )
-                                        # Reset patch attempt state after successful patch and restart
-                                        self.patch_attempted = False
-                                    else:
-                                        print("Service restart failed")
-                                        await bot.rest.create_message(
-                                            channel_id,
-                                            content="⚠️ Patch attempted & service restart failed - manual intervention may be required"
-                                        )
-                                else:
-                                    print("Automatic patch update failed")
-                                    await bot.rest.create_message(
-                                        channel_id,
-                                        content="⚠️ Automatic patch update failed"
-                                    )
-                            except Exception as patch_error:
-                                print(f"Error during automatic patch update: {patch_error}")
-                                await bot.rest.create_message(
-                                    channel_id,
-                                    content=f"❌ Automatic patch update encountered an error: {str(patch_error)}"
-                                )
-
-                    # Log recovery
-                    elif not self.api_state and api_is_up:
-                        print(f"API endpoint recovered and is now UP")
-                        await bot.rest.create_message(
-                            channel_id,
-                            content=f"API endpoint {self.api_endpoint} is back online"
-                        )
-                        self.api_state = True
-                        self.patch_attempted = False
-
+                    await asyncio.to_thread(self.history.flush)
                 except Exception as e:
-                    print(f"Error in API endpoint monitoring: {e}")
-
-            await asyncio.sleep(self.check_interval)
+                    print(f"Error flushing monitor history: {e}")
+
+    def _update_snapshot(self, port_results, api_result):
+        """Merge the latest probe results into the snapshot that /ping answers from"""
+        checked_at = time.time()
+        for port, is_up in port_results.items():
+            self._last_results[port] = (is_up, checked_at)
+        if api_result is not None:
+            self._last_results["api"] = (api_result, checked_at)
+
+        targets = list(self.ports_to_monitor) + (["api"] if self.api_endpoint else [])
+        if any(target not in self._last_results for target in targets):
+            return
+
+        snapshot = self.summarize_status(
+            {port: self._last_results[port][0] for port in self.ports_to_monitor},
+            self._last_results["api"][0] if self.api_endpoint else None
+        )
+        # The snapshot is as old as its oldest result
+        snapshot["checked_at"] = min(self._last_results[target][1] for target in targets)
+        self.status_snapshot = snapshot
 
     async def check_all_ports(self, timeout=1):
         """
@@ -291,6 +458,57 @@ class ServerMonitor:
             except Exception:
                 api_result = False
 
+        return self.summarize_status(port_results, api_result)
+
+    async def get_status(self, timeout=1):
+        """
+        Return the latest status snapshot without probing on every call.
+
+        A fresh snapshot is returned as is. A stale one is still returned right
+        away while one background refresh updates it; concurrent callers share
+        that refresh. Only the very first call, before any snapshot exists, waits
+        for probes.
+
+        Args:
+            timeout (int): Connection timeout for a refresh in seconds
+
+        Returns:
+            dict: Status information from check_all_ports, plus its "age" in seconds
+        """
+        snapshot = self.status_snapshot
+        if snapshot is None:
+            await asyncio.shield(self._start_refresh(timeout))
+            snapshot = self.status_snapshot
+        elif time.time() - snapshot["checked_at"] > self.status_ttl:
+            self._start_refresh(timeout)
+
+        return {**snapshot, "age": time.time() - snapshot["checked_at"]}
+
+    def _start_refresh(self, timeout):
+        """Start a snapshot refresh unless one is already running"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_status(timeout))
+        return self._refresh_task
+
+    async def _refresh_status(self, timeout):
+        try:
+            self.status_snapshot = await self.check_all_ports(timeout=timeout)
+        except Exception as e:
+            print(f"Error refreshing status snapshot: {e}")
+            if self.status_snapshot is None:
+                raise
+
+    def summarize_status(self, port_results, api_result):
+        """
+        Build the status report for a set of probe results
+
+        Args:
+            port_results (dict): Dictionary mapping ports to True/False
+            api_result (bool): API endpoint result, ignored without an endpoint
+
+        Returns:
+            dict: Dictionary with port status information
+        """
         up_ports = sum(1 for status in port_results.values() if status)
         down_ports = sum(1 for status in port_results.values() if not status)
 
@@ -327,5 +545,59 @@ class ServerMonitor:
             "up_ports": up_ports,
             "down_ports": down_ports,
             "port_results": port_results,
-            "api_result": api_result if self.api_endpoint else None
-        }
\ No newline at end of file
+            "api_result": api_result if self.api_endpoint else None,
+            "checked_at": time.time()
+        }
+
+    def latency_report(self, window=900):
+        """
+        Summarize probe latency and error rate for every monitored target
+
+        Args:
+            window (int): Sliding window in seconds
+
+        Returns:
+            list: One formatted status line per target
+        """
+        targets = [(port, self.port_services.get(port, f"Port {port}")) for port in self.ports_to_monitor]
+        if self.api_endpoint:
+            targets.append(("api", "API Endpoint"))
+
+        lines = []
+        for target, service_name in targets:
+            stats = self.latency.stats(target, window)
+            if not stats or not stats["count"]:
+                lines.append(f"{service_name}: no samples yet")
+                continue
+            if stats["p50"] is None:
+                latency = "no successful probes"
+            else:
+                latency = (f"p50 {stats['p50'] * 1000:.1f} ms / p95 {stats['p95'] * 1000:.1f} ms"
+                           f" / p99 {stats['p99'] * 1000:.1f} ms")
+            lines.append(f"{service_name}: {latency}, errors {stats['error_rate']:.1%} "
+                         f"({stats['errors']}/{stats['count']})")
+        return lines
+
+    def uptime_report(self, days=30):
+        """
+        Summarize uptime for every monitored target from the history store
+
+        Args:
+            days (int): Window size in days
+
+        Returns:
+            list: One formatted status line per target
+        """
+        targets = [(port, self.port_services.get(port, f"Port {port}")) for port in self.ports_to_monitor]
+        if self.api_endpoint:
+            targets.append(("api", "API Endpoint"))
+
+        lines = []
+        for target, service_name in targets:
+            stats = self.history.uptime(self.history_key(target), window=days * 86400)
+            if stats["uptime"] is None:
+                lines.append(f"{service_name}: no history yet")
+                continue
+            lines.append(f"{service_name}: {stats['uptime']:.3%} up over {stats['count']} probes, "
+                         f"mean latency {stats['latency_mean'] * 1000:.1f} ms")
+        return lines
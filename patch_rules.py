@@ -0,0 +1,106 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+
+# Used when no rules file is configured: the original endpoint fix
+DEFAULT_RULES = [
+    {
+        "name": "submit-transaction endpoint",
+        "files": ["app.py", "templates/index.html"],
+        "literal": "/transaction",
+        "replace": "/submit-transaction",
+    },
+]
+
+
+class PatchRule:
+    def __init__(self, name, files, replace, pattern=None, literal=None, flags=""):
+        """
+        Initialize the PatchRule class.
+
+        A rule is either a regex (`pattern`) or a plain string (`literal`)
+        substitution, applied to remote files whose path relative to the
+        remote directory matches one of the `files` globs.
+
+        Args:
+            name (str): Name shown in patch reports
+            files (list): Globs such as "app.py" or "templates/**/*.html"
+            replace (str): Replacement text, may use \\1 groups for regex rules
+            pattern (str): Regular expression to replace
+            literal (str): Exact text to replace
+            flags (str): Regex flags: any of "i" (ignore case), "m" (multiline), "s" (dot matches newline)
+        """
+        if (pattern is None) == (literal is None):
+            raise ValueError(f"Patch rule {name!r} needs exactly one of pattern or literal")
+        self.name = name
+        self.files = list(files)
+        self.replace = replace
+        self.pattern = pattern
+        self.literal = literal
+        self.flags = flags
+        regex_flags = 0
+        for flag in flags:
+            regex_flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}[flag]
+        self._regex = re.compile(pattern, regex_flags) if pattern is not None else None
+
+    def applies_to(self, path):
+        # "**/" also matches no directory at all, the same as bash's globstar
+        return any(fnmatch.fnmatchcase(path, glob) or fnmatch.fnmatchcase(path, glob.replace("**/", ""))
+                   for glob in self.files)
+
+    def apply(self, text):
+        """
+        Apply the substitution
+
+        Returns:
+            tuple: (new text, number of replacements)
+        """
+        if self._regex is not None:
+            return self._regex.subn(self.replace, text)
+        count = text.count(self.literal)
+        return (text.replace(self.literal, self.replace), count) if count else (text, 0)
+
+    def to_dict(self):
+        rule = {"name": self.name, "files": self.files, "replace": self.replace}
+        if self.pattern is not None:
+            rule["pattern"] = self.pattern
+            if self.flags:
+                rule["flags"] = self.flags
+        else:
+            rule["literal"] = self.literal
+        return rule
+
+
+def load_rules(path=None):
+    """
+    Load patch rules from a JSON file holding a list of rule objects
+
+    Args:
+        path (str): Rules file; DEFAULT_RULES are used if it is not given or does not exist
+
+    Returns:
+        list: PatchRule objects
+    """
+    rules = DEFAULT_RULES
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    return [PatchRule(**rule) for rule in rules]
+
+
+def rules_fingerprint(rules):
+    """Stable hash of a rule set, so results cached for one rule set are not reused for another"""
+    encoded = json.dumps([rule.to_dict() for rule in rules], sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def glob_patterns(rules):
+    """Every file glob used by a rule set, in first-seen order"""
+    patterns = []
+    for rule in rules:
+        for glob in rule.files:
+            if glob not in patterns:
+                patterns.append(glob)
+    return patterns
@@ -1,13 +1,48 @@
-import os
-import paramiko
-import tempfile
-from io import StringIO
+import datetime
+import functools
+import hashlib
+import posixpath
+import shlex
+import stat
+import time
+import patch_rules
+from ssh_pool import SSHPool
+from metrics import REGISTRY, DURATION_BUCKETS
+
+# Remote directories that are never patched
+EXCLUDED_DIRS = ('venv', '__pycache__')
+
+PATCH_OPERATIONS = REGISTRY.counter("patch_operations", "Patch, restart and rollback runs by result",
+                                    ("operation", "result"))
+PATCH_SECONDS = REGISTRY.histogram("patch_duration_seconds", "Wall time of patch, restart and rollback runs",
+                                   ("operation",), buckets=DURATION_BUCKETS)
+PATCH_FILES = REGISTRY.counter("patch_files", "Remote files seen by patch runs, by what happened to them",
+                               ("stage",))
+
+
+def _instrumented(operation):
+    """Count and time an operation; a False or None result counts as an error"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                ok = result is not None and result is not False
+                PATCH_OPERATIONS.inc(operation, "ok" if ok else "error")
+                PATCH_SECONDS.observe(time.perf_counter() - start, operation)
+        return wrapper
+    return decorator
 
 class PatchUpdate:
     def __init__(self,
                  ssh_host=None, ssh_port=22, ssh_username=None,
                  ssh_key_passphrase=None,
-                 remote_dir="/var/www/student_app"):
+                 remote_dir="/var/www/student_app", ssh_pool=None,
+                 rules=None, fetch_batch=32, keep_backups=10):
         """
         Initialize the PatchUpdate class.
         
@@ -17,53 +52,38 @@ class PatchUpdate:
             ssh_username (str): SSH username
             ssh_key_passphrase (str): Passphrase for the SSH key
             remote_dir (str): Remote directory
+            ssh_pool (SSHPool): Shared connection pool, so a patch and the restart
+                                after it reuse one connection
+            rules (list): PatchRule objects, defaults to patch_rules.DEFAULT_RULES
+            fetch_batch (int): Files whose reads are in flight at once
+            keep_backups (int): Patch runs whose original files are kept for rollback
         """
         self.ssh_host = ssh_host
         self.ssh_port = ssh_port
         self.ssh_username = ssh_username
         self.ssh_key_passphrase = ssh_key_passphrase
         self.remote_dir = remote_dir
+        self.ssh_pool = ssh_pool or SSHPool(ssh_host, ssh_port, ssh_username, ssh_key_passphrase)
+        self.rules = rules if rules is not None else patch_rules.load_rules()
+        self.fetch_batch = fetch_batch
+        self.keep_backups = keep_backups
+        # Originals of patched files, outside the web root: <remote_dir>.patch-backups/<patch id>/<path>
+        self.backup_root = remote_dir.rstrip("/") + ".patch-backups"
+        self.last_report = None
+        # Remote path -> SHA-256 of content the current rules leave unchanged
+        self._clean = {}
+        self._clean_rules = None
 
-    def _connect_ssh(self):
-        """
-        Establish SSH connection to the server.
-        """
-        try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh_key_data = os.getenv("SSH_KEY")
-            if not ssh_key_data:
-                raise ValueError("SSH_KEY environment variable is not set or empty.")
-
-            # Replace literal \n with actual newlines
-            ssh_key_data = ssh_key_data.replace("\\n", "\n")
-
-            # Load the private key
-            private_key = paramiko.Ed25519Key.from_private_key(StringIO(ssh_key_data), password=self.ssh_key_passphrase)
-
-            # Connect to the server
-            client.connect(
-                hostname=self.ssh_host,
-                port=self.ssh_port,
-                username=self.ssh_username,
-                pkey=private_key
-            )
-
-            return client
-        except Exception as e:
-            print(f"SSH connection error: {e}")
-            return None
-
+    @_instrumented("restart")
     def restart_service(self):
         try:
-            ssh_client = self._connect_ssh()
-            if not ssh_client:
-                print("Failed to establish SSH connection for service restart")
-                return False
-            stdin, stdout, stderr = ssh_client.exec_command("sudo systemctl restart student_app.service")
-            exit_status = stdout.channel.recv_exit_status()
-            stderr_output = stderr.read().decode('utf-8').strip()
-            ssh_client.close()
+            with self.ssh_pool.connection() as ssh_client:
+                if not ssh_client:
+                    print("Failed to establish SSH connection for service restart")
+                    return False
+                stdin, stdout, stderr = ssh_client.exec_command("sudo systemctl restart student_app.service")
+                exit_status = stdout.channel.recv_exit_status()
+                stderr_output = stderr.read().decode('utf-8').strip()
 
             if exit_status == 0:
                 print("Service restart completed successfully")
@@ -77,87 +97,295 @@ class PatchUpdate:
             print(f"Error restarting service: {e}")
             return False
 
+    @_instrumented("patch")
     def modify_file(self):
-        temp_app = None
-        temp_index = None
+        """
+        Apply the patch rules to every matching remote file.
+        
+        One batched exec lists, sizes and hashes all files matched by the
+        rules' globs, files already known to be clean under the current rules are
+        skipped, and the rest are read over one SFTP session with their reads
+        pipelined in batches.
+        
+        Nothing touches local disk. Every changed file is first written to a
+        temp file next to it and its original content to the backup tree; only
+        when all of them are staged is each temp file posix_rename'd over its
+        original. A crash can therefore leave a stray temp file but never a
+        half-written source file, and rollback() puts the originals back.
+        
+        Returns:
+            bool: True if the patch run completed, False otherwise
+        """
+        start = time.perf_counter()
+        ssh_client = None
+        sftp = None
         try:
-            # Connect to SSH
-            ssh_client = self._connect_ssh()
+            # Borrow a connection from the pool
+            ssh_client = self.ssh_pool.acquire()
             if not ssh_client:
                 print("Failed to establish SSH connection")
                 return False
-
-            # Get SFTP client
+            
+            fingerprint = patch_rules.rules_fingerprint(self.rules)
+            if fingerprint != self._clean_rules:
+                self._clean, self._clean_rules = {}, fingerprint
+            
             sftp = ssh_client.open_sftp()
+            hashes = self._remote_hashes(ssh_client)
+            if hashes is None:
+                # No bash/sha256sum on the server: list over SFTP and fetch everything
+                hashes = {path: (None, None) for path in self._remote_files(sftp, self.remote_dir)}
+            
+            candidates = [
+                path for path, (sha256, _) in hashes.items()
+                if any(rule.applies_to(path) for rule in self.rules)
+                and not (sha256 and self._clean.get(path) == sha256)
+            ]
+            report = {"matched": len(hashes), "skipped": len(hashes) - len(candidates),
+                      "fetched": 0, "changed": [], "replacements": {}}
+            
+            patch_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            staged = []
             try:
-                sftp.chdir(self.remote_dir)
-            except Exception as e:
-                print(f"Failed to change to remote directory {self.remote_dir}: {e}")
-                return False
-
-            # Create temporary files
-            temp_app_fd, temp_app = tempfile.mkstemp(suffix='.py', prefix='app_')
-            temp_index_fd, temp_index = tempfile.mkstemp(suffix='.html', prefix='index_')
-            os.close(temp_app_fd)
-            os.close(temp_index_fd)
-
-            sftp.get("app.py", temp_app)
-            if self.updateEndpoint(temp_app):
-                print("Uploading modified app.py...")
-                sftp.put(temp_app, "app.py")
-            else:
-                print("No changes needed in app.py")
-
-            try:
-                sftp.get("templates/index.html", temp_index)
-                if self.updateEndpoint(temp_index):
-                    print("Uploading modified templates/index.html...")
-                    sftp.put(temp_index, "templates/index.html")
-                else:
-                    print("No changes needed in templates/index.html")
-            except Exception as e:
-                print(f"Error processing templates/index.html: {e}")
-
-            sftp.close()
-            ssh_client.close()
+                for i in range(0, len(candidates), self.fetch_batch):
+                    batch = candidates[i:i + self.fetch_batch]
+                    for path, data in self._fetch_files(sftp, batch, [hashes[path][1] for path in batch]):
+                        report["fetched"] += 1
+                        self._patch_file(sftp, path, data, report, patch_id, staged)
+                self._commit(sftp, staged)
+            except Exception:
+                self._discard(sftp, staged)
+                raise
+            if staged:
+                report["patch_id"] = patch_id
+                self._prune_backups(ssh_client, sftp)
+            
+            report["seconds"] = time.perf_counter() - start
+            self.last_report = report
+            PATCH_FILES.inc("matched", amount=report["matched"])
+            PATCH_FILES.inc("skipped", amount=report["skipped"])
+            PATCH_FILES.inc("fetched", amount=report["fetched"])
+            PATCH_FILES.inc("changed", amount=len(report["changed"]))
+            print(f"Patch run: {report['matched']} files matched, {report['skipped']} unchanged and skipped, "
+                  f"{report['fetched']} fetched, {len(report['changed'])} modified in {report['seconds']:.2f}s")
             return True
-
+        
         except Exception as e:
             print(f"Patch update error: {e}")
             return False
         finally:
-            if temp_app and os.path.exists(temp_app):
-                try:
-                    os.remove(temp_app)
-                except Exception as e:
-                    print(f"Failed to clean up {temp_app}: {e}")
-
-            if temp_index and os.path.exists(temp_index):
+            if sftp:
+                sftp.close()
+            if ssh_client:
+                self.ssh_pool.release(ssh_client)
+    
+    def _remote_hashes(self, ssh_client):
+        """
+        Expand every rule glob and size and hash the matches in a single remote command
+        
+        Returns:
+            dict: Path relative to remote_dir -> (SHA-256, size), or None if the command failed
+        """
+        globs = " ".join(self._shell_glob(glob) for glob in patch_rules.glob_patterns(self.rules))
+        # Globstar also matches directories, which would fail sha256sum, so keep regular files only.
+        # Sizes first, one line per file in argument order, then a separator and the hashes in the same order
+        script = (f'cd {shlex.quote(self.remote_dir)} && files=() && '
+                  f'for f in {globs}; do if [ -f "$f" ]; then files+=("$f"); fi; done && '
+                  f'if [ ${{#files[@]}} -gt 0 ]; then '
+                  f'stat -L -c %s -- "${{files[@]}}" && echo -- && sha256sum -- "${{files[@]}}"; fi')
+        stdin, stdout, stderr = ssh_client.exec_command(f"bash -O globstar -O nullglob -c {shlex.quote(script)}")
+        stdin.close()
+        output = stdout.read().decode("utf-8", errors="replace")
+        if stdout.channel.recv_exit_status() != 0:
+            print(f"Remote hash check failed: {stderr.read().decode('utf-8', errors='replace').strip()}")
+            return None
+        
+        lines = output.splitlines()
+        separator = lines.index("--") if "--" in lines else len(lines)
+        hashes = {}
+        for size, line in zip(lines[:separator], lines[separator + 1:]):
+            # sha256sum escapes unusual names with a leading backslash; let those fall to a fetch
+            sha256, _, path = line.partition("  ")
+            if not path or line.startswith("\\"):
+                continue
+            path = posixpath.normpath(path)
+            if not any(part in EXCLUDED_DIRS for part in path.split("/")):
+                hashes[path] = (sha256, int(size) if size.isdigit() else None)
+        return hashes
+    
+    @staticmethod
+    def _shell_glob(glob):
+        """Quote a glob for the shell while keeping its wildcards active"""
+        return "".join(c if c.isalnum() or c in "*?[]/._-" else "\\" + c for c in glob)
+    
+    def _remote_files(self, sftp, remote_dir, prefix=""):
+        """Walk the remote tree over SFTP, yielding paths relative to remote_dir"""
+        for item in sftp.listdir_attr(remote_dir):
+            if item.filename in EXCLUDED_DIRS:
+                continue
+            path = posixpath.join(prefix, item.filename)
+            if stat.S_ISDIR(item.st_mode):
+                yield from self._remote_files(sftp, posixpath.join(remote_dir, item.filename), path)
+            else:
+                yield path
+    
+    def _fetch_files(self, sftp, paths, sizes):
+        """
+        Read a batch of remote files with all their read requests in flight at once
+        
+        Args:
+            paths (list): Paths relative to remote_dir
+            sizes (list): Size of each file from the hash listing, None where unknown
+        
+        Yields:
+            tuple: (path, content bytes)
+        """
+        handles = []
+        try:
+            for path, size in zip(paths, sizes):
+                handle = sftp.open(posixpath.join(self.remote_dir, path), "rb")
+                handles.append((path, handle))
+                # Queue every read for the file now instead of one round trip per block;
+                # a known size also saves prefetch() its own stat round trip
+                handle.prefetch(size)
+            for path, handle in handles:
+                yield path, handle.read()
+        finally:
+            for _, handle in handles:
+                handle.close()
+    
+    def _apply_rules(self, path, text):
+        counts = {}
+        for rule in self.rules:
+            if rule.applies_to(path):
+                text, count = rule.apply(text)
+                if count:
+                    counts[rule.name] = count
+        return text, counts
+    
+    def _patch_file(self, sftp, path, data, report, patch_id, staged):
+        """Apply the rules to one file's content and stage the result if it changed"""
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            print(f"Skipping {path}: not UTF-8 text")
+            return
+        
+        patched, counts = self._apply_rules(path, text)
+        if counts:
+            print(f"Staging modified {path}...")
+            original = data
+            data = patched.encode("utf-8")
+            staged.append(self._stage(sftp, path, original, data, patch_id))
+            report["changed"].append(path)
+            for name, count in counts.items():
+                report["replacements"][name] = report["replacements"].get(name, 0) + count
+        else:
+            print(f"No changes needed in {path}")
+        
+        # Remember content the rules no longer touch, so the next run skips it unread
+        if not self._apply_rules(path, patched)[1]:
+            self._clean[path] = hashlib.sha256(data).hexdigest()
+    
+    def _stage(self, sftp, path, original, data, patch_id):
+        """
+        Write the original to the backup tree and the new content to a temp file beside the target
+        
+        Returns:
+            tuple: (target path, temp path, backup path) on the server
+        """
+        target = posixpath.join(self.remote_dir, path)
+        directory, name = posixpath.split(target)
+        temp = posixpath.join(directory, f".{name}.patch-{patch_id}.tmp")
+        backup = posixpath.join(self.backup_root, patch_id, path)
+        mode = stat.S_IMODE(sftp.stat(target).st_mode)
+        
+        self._makedirs(sftp, posixpath.dirname(backup))
+        self._write_remote(sftp, backup, original, mode)
+        self._write_remote(sftp, temp, data, mode)
+        return target, temp, backup
+    
+    @staticmethod
+    def _write_remote(sftp, path, data, mode):
+        with sftp.open(path, "wb") as remote_file:
+            remote_file.set_pipelined(True)
+            remote_file.write(data)
+        sftp.chmod(path, mode)
+    
+    def _makedirs(self, sftp, path):
+        try:
+            sftp.stat(path)
+        except FileNotFoundError:
+            self._makedirs(sftp, posixpath.dirname(path))
+            sftp.mkdir(path)
+    
+    def _commit(self, sftp, staged):
+        """Rename every staged file into place, undoing the renames done so far if one fails"""
+        renamed = []
+        try:
+            for target, temp, backup in staged:
+                sftp.posix_rename(temp, target)
+                renamed.append((target, temp, backup))
+        except Exception:
+            for target, _, backup in renamed:
+                sftp.posix_rename(backup, target)
+            raise
+        print(f"Patched {len(staged)} files atomically")
+    
+    def _discard(self, sftp, staged):
+        """Remove temp files and backups left by an aborted patch run"""
+        for _, temp, backup in staged:
+            for path in (temp, backup):
                 try:
-                    os.remove(temp_index)
-                except Exception as e:
-                    print(f"Failed to clean up {temp_index}: {e}")
-
-    def updateEndpoint(self, local_temp):
+                    sftp.remove(path)
+                except OSError:
+                    pass
+    
+    def _prune_backups(self, ssh_client, sftp):
+        """Delete the oldest patch backups beyond keep_backups"""
+        patch_ids = sorted(sftp.listdir(self.backup_root))
+        for patch_id in patch_ids[:-self.keep_backups or None]:
+            stdin, stdout, stderr = ssh_client.exec_command(
+                f"rm -rf -- {shlex.quote(posixpath.join(self.backup_root, patch_id))}"
+            )
+            stdout.channel.recv_exit_status()
+    
+    @_instrumented("rollback")
+    def rollback(self, patch_id=None):
         """
-        Check if the file contains the broken path and fix it.
+        Put back the original files of a patch run by renaming its backups over them
+        
         Args:
-            local_temp (str): Path to the local temporary file
+            patch_id (str): Patch run to undo, defaults to the most recent one
+        
         Returns:
-            bool: True if changes were made, False otherwise
+            list: Paths restored, or None if the rollback failed
         """
-        old_line = "/transaction"
-        new_line = "/submit-transaction"
-        changes_made = False
-
         try:
-            with open(local_temp, 'r', encoding='utf-8') as file:
-                content = file.read()
-            if old_line in content:
-                modified_content = content.replace(old_line, new_line)
-                with open(local_temp, 'w', encoding='utf-8') as file:
-                    file.write(modified_content)
-                changes_made = True
+            with self.ssh_pool.connection() as ssh_client:
+                if not ssh_client:
+                    print("Failed to establish SSH connection for rollback")
+                    return None
+                sftp = ssh_client.open_sftp()
+                try:
+                    patch_ids = sorted(sftp.listdir(self.backup_root))
+                    if not patch_ids or (patch_id and patch_id not in patch_ids):
+                        print(f"No patch backup {patch_id or ''} to roll back")
+                        return None
+                    patch_id = patch_id or patch_ids[-1]
+                    backup_dir = posixpath.join(self.backup_root, patch_id)
+                    
+                    restored = []
+                    for path in self._remote_files(sftp, backup_dir):
+                        sftp.posix_rename(posixpath.join(backup_dir, path), posixpath.join(self.remote_dir, path))
+                        self._clean.pop(path, None)
+                        restored.append(path)
+                    stdin, stdout, stderr = ssh_client.exec_command(f"rm -rf -- {shlex.quote(backup_dir)}")
+                    stdout.channel.recv_exit_status()
+                finally:
+                    sftp.close()
+            print(f"Rolled back patch {patch_id}: {len(restored)} files restored")
+            return restored
         except Exception as e:
-            print(f"Error processing file {local_temp}: {e}")
-        return changes_made
\ No newline at end of file
+            print(f"Rollback error: {e}")
+            return None
@@ -0,0 +1,109 @@
+import socket
+import asyncio
+
+
+def check_socket(host, port, timeout):
+    """
+    Blocking TCP connect check, used by the threaded fallback path.
+
+    Returns:
+        bool: True if the connection succeeded, False otherwise
+    """
+    try:
+        # Use context manager to ensure socket is always closed properly
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as socket_obj:
+            socket_obj.settimeout(timeout)
+            return socket_obj.connect_ex((host, port)) == 0
+    except socket.error as e:
+        print(f"Socket error on {host}:{port} - {e}")
+        return False
+    except Exception as e:
+        print(f"Unexpected error checking {host}:{port} - {e}")
+        return False
+
+
+class ProbeEngine:
+    def __init__(self, max_concurrency=500, use_threads=False):
+        """
+        Initialize the ProbeEngine class.
+
+        Native probes are non-blocking connects on the event loop, so a probe
+        waiting on a slow host holds a socket and nothing else. The threaded path
+        runs the old blocking connect_ex through asyncio.to_thread and is kept as
+        a fallback for loops that cannot do native connects.
+
+        Args:
+            max_concurrency (int): Maximum number of probes running at once
+            use_threads (bool): Always use the threaded fallback path
+        """
+        self.max_concurrency = max_concurrency
+        self.use_threads = use_threads
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        # Created lazily so it binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def check(self, host, port, timeout=2):
+        """
+        Check if a port on a host accepts TCP connections
+
+        Args:
+            host (str): Hostname or IP address
+            port (int): Port to probe
+            timeout (float): Deadline for the whole probe in seconds
+
+        Returns:
+            bool: True if the port is open, False otherwise
+        """
+        async with self._get_semaphore():
+            if self.use_threads:
+                return await self._check_threaded(host, port, timeout)
+            try:
+                return await self._check_native(host, port, timeout)
+            except NotImplementedError:
+                # Loop without native socket support, e.g. some Windows selector setups
+                print("Native probes unavailable on this event loop, falling back to threads")
+                self.use_threads = True
+                return await self._check_threaded(host, port, timeout)
+
+    async def _check_native(self, host, port, timeout):
+        """Non-blocking connect with a per-probe deadline"""
+        loop = asyncio.get_running_loop()
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as socket_obj:
+            socket_obj.setblocking(False)
+            try:
+                await asyncio.wait_for(loop.sock_connect(socket_obj, (host, port)), timeout=timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+            except OSError:
+                # Connection refused, unreachable host, DNS failure
+                return False
+
+    async def _check_threaded(self, host, port, timeout):
+        try:
+            return await asyncio.to_thread(check_socket, host, port, timeout)
+        except Exception as e:
+            print(f"Error checking port {host}:{port}: {e}")
+            return False
+
+    async def check_many(self, targets, timeout=2):
+        """
+        Check many (host, port) targets concurrently
+
+        Args:
+            targets (list): List of (host, port) tuples
+            timeout (float): Deadline for each probe in seconds
+
+        Returns:
+            dict: Dictionary mapping (host, port) to True/False
+        """
+        targets = list(targets)
+        results = await asyncio.gather(
+            *(self.check(host, port, timeout) for host, port in targets),
+            return_exceptions=True
+        )
+        return {target: result is True for target, result in zip(targets, results)}
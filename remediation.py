@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import deque
+from metrics import REGISTRY, DURATION_BUCKETS
+
+REMEDIATIONS = REGISTRY.counter("remediations", "Automatic remediation runs by outcome", ("outcome",))
+RECOVERY_SECONDS = REGISTRY.histogram("recovery_seconds", "Seconds from outage detection to confirmed recovery",
+                                      buckets=DURATION_BUCKETS)
+
+
+class RemediationPipeline:
+    def __init__(self, patch, ready_check, initial_delay=0.25, max_delay=5, backoff=2.0,
+                 ready_timeout=180, max_incidents=100):
+        """
+        Initialize the RemediationPipeline class.
+
+        Runs patch -> restart -> readiness polling for an outage and keeps a
+        record of every incident. Right after the restart the endpoint is
+        polled with a short, exponentially growing delay, so recovery is seen
+        within a fraction of a second of the service coming back instead of on
+        the next regular check.
+
+        Args:
+            patch (PatchUpdate): Patch updater that fixes files and restarts the service
+            ready_check: Async callable returning True once the service answers correctly
+            initial_delay (float): Seconds before the first readiness poll
+            max_delay (float): Longest delay between readiness polls
+            backoff (float): Factor the delay grows by after each failed poll
+            ready_timeout (float): Seconds after the restart before giving up on recovery
+            max_incidents (int): Incidents kept for reports and MTTR
+        """
+        self.patch = patch
+        self.ready_check = ready_check
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.ready_timeout = ready_timeout
+        self.incidents = deque(maxlen=max_incidents)
+        self.current = None
+
+    @property
+    def active(self):
+        return self.current is not None
+
+    async def run(self, detected_at=None, notify=None):
+        """
+        Remediate one outage
+
+        Args:
+            detected_at (float): Wall-clock time the outage was confirmed, defaults to now
+            notify: Optional async callable taking a message string
+
+        Returns:
+            dict: The incident with detected/patched/restarted/recovered timestamps and outcome
+        """
+        incident = {
+            "detected": detected_at or time.time(),
+            "patched": None,
+            "restarted": None,
+            "recovered": None,
+            "polls": 0,
+            "outcome": "running",
+        }
+        self.current = incident
+        self.incidents.append(incident)
+        notify = notify or self._no_notify
+        try:
+            success = await asyncio.to_thread(self.patch.modify_file)
+            if not success:
+                incident["outcome"] = "patch failed"
+                await notify("⚠️ Automatic patch update failed")
+                return incident
+            incident["patched"] = time.time()
+            await notify("🔧 Automatic patch update completed - restarting service...")
+
+            restart_success = await asyncio.to_thread(self.patch.restart_service)
+            if not restart_success:
+                incident["outcome"] = "restart failed"
+                await notify("⚠️ Patch attempted & service restart failed - manual intervention may be required")
+                return incident
+            incident["restarted"] = time.time()
+
+            if await self._wait_ready(incident):
+                incident["recovered"] = time.time()
+                incident["outcome"] = "recovered"
+                await notify(
+                    f"✅ Service recovered {incident['recovered'] - incident['detected']:.1f}s after detection "
+                    f"(ready {incident['recovered'] - incident['restarted']:.1f}s after restart, "
+                    f"{incident['polls']} polls). MTTR: {self.mttr():.1f}s"
+                )
+            else:
+                incident["outcome"] = "not ready"
+                await notify(f"⚠️ Service restarted but not ready after {self.ready_timeout:.0f}s")
+            return incident
+        except Exception as e:
+            incident["outcome"] = f"error: {e}"
+            await notify(f"❌ Automatic patch update encountered an error: {str(e)}")
+            return incident
+        finally:
+            self.current = None
+            # "error: <message>" would make a new series for every message
+            REMEDIATIONS.inc(incident["outcome"].split(":")[0])
+            if incident["recovered"]:
+                RECOVERY_SECONDS.observe(incident["recovered"] - incident["detected"])
+
+    async def _wait_ready(self, incident):
+        """Poll readiness with exponential backoff until it passes or ready_timeout runs out"""
+        deadline = time.monotonic() + self.ready_timeout
+        delay = self.initial_delay
+        while True:
+            await asyncio.sleep(min(delay, max(0, deadline - time.monotonic())))
+            incident["polls"] += 1
+            if await self.ready_check():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            delay = min(delay * self.backoff, self.max_delay)
+
+    @staticmethod
+    async def _no_notify(content):
+        pass
+
+    def mttr(self):
+        """
+        Mean time to recovery over the recorded incidents that recovered
+
+        Returns:
+            float: Mean seconds from detection to recovery, None if nothing recovered yet
+        """
+        durations = [i["recovered"] - i["detected"] for i in self.incidents if i["recovered"]]
+        return sum(durations) / len(durations) if durations else None
+
+    def report(self, limit=5):
+        """
+        Summarize MTTR and the most recent incidents
+
+        Returns:
+            list: Lines for a Discord message
+        """
+        mttr = self.mttr()
+        recovered = sum(1 for i in self.incidents if i["recovered"])
+        lines = [f"MTTR: {mttr:.1f}s over {recovered} recovered incidents" if mttr is not None
+                 else "MTTR: no recovered incidents yet"]
+        for incident in list(self.incidents)[-limit:][::-1]:
+            detected = incident["detected"]
+            stages = []
+            for stage in ("patched", "restarted", "recovered"):
+                if incident[stage]:
+                    stages.append(f"{stage} +{incident[stage] - detected:.1f}s")
+            detected_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(detected))
+            lines.append(f"`{detected_text}` {incident['outcome']}: {', '.join(stages) or 'no stages completed'}")
+        return lines
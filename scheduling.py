@@ -0,0 +1,117 @@
+import heapq
+import random
+
+
+class AdaptiveSchedule:
+    def __init__(self, base_interval=60, min_interval=None, max_interval=None, backoff=2.0,
+                 stable_after=10, jitter=0.1):
+        """
+        Initialize the AdaptiveSchedule class.
+
+        Each target runs on its own fixed-rate clock: the next slot is the
+        previous slot plus the interval, not "now" plus the interval, so time
+        spent probing never accumulates as drift. Probes fire at their slot
+        plus a little jitter, and first slots are spread randomly, so targets
+        do not all fire at the same moment.
+
+        The interval adapts per target. A target that is down or has an
+        unconfirmed state change is probed every `min_interval`; one that has
+        been up for `stable_after` probes in a row backs off by `backoff` per
+        further `stable_after` probes, up to `max_interval`.
+
+        Args:
+            base_interval (float): Normal seconds between probes of a target
+            min_interval (float): Seconds between probes while degraded or recovering
+            max_interval (float): Upper bound for the backed-off interval
+            backoff (float): Interval multiplier applied per stable period
+            stable_after (int): Healthy probes in a row before backing off
+            jitter (float): Random offset as a fraction of the interval
+        """
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval or base_interval, base_interval)
+        self.max_interval = max(max_interval or base_interval * 3, base_interval)
+        self.backoff = backoff
+        self.stable_after = max(1, stable_after)
+        self.jitter = jitter
+        self._slots = {}
+        self._streaks = {}
+        self._heap = []
+        self._sequence = 0
+
+    def add(self, key, now, spread=None):
+        """
+        Register a target and return when it should first be probed
+
+        Args:
+            key: Target identifier
+            now (float): Current monotonic time
+            spread (float): First probes are spread over this many seconds,
+                            defaults to the base interval
+
+        Returns:
+            float: Monotonic time of the first probe
+        """
+        spread = self.base_interval if spread is None else spread
+        slot = now + random.uniform(0, spread)
+        self._slots[key] = slot
+        self._streaks[key] = 0
+        return slot
+
+    def remove(self, key):
+        self._slots.pop(key, None)
+        self._streaks.pop(key, None)
+
+    def interval(self, key, is_up, pending=False):
+        """Seconds until the next probe of a target in the given state"""
+        if not is_up or pending:
+            return self.min_interval
+        stable_periods = self._streaks.get(key, 0) // self.stable_after
+        if stable_periods == 0:
+            return self.base_interval
+        return min(self.max_interval, self.base_interval * self.backoff ** stable_periods)
+
+    def next(self, key, now, is_up, pending=False):
+        """
+        Advance a target's clock after a probe
+
+        Args:
+            key: Target identifier
+            now (float): Current monotonic time
+            is_up (bool): Confirmed state after the probe
+            pending (bool): Whether a state change is waiting for confirmation
+
+        Returns:
+            float: Monotonic time of the next probe
+        """
+        if is_up and not pending:
+            self._streaks[key] = self._streaks.get(key, 0) + 1
+        else:
+            self._streaks[key] = 0
+
+        interval = self.interval(key, is_up, pending)
+        slot = self._slots.get(key, now) + interval
+        if slot <= now:
+            # Fell behind (slow probe, suspended host): skip missed slots instead of bursting
+            slot += ((now - slot) // interval + 1) * interval
+        self._slots[key] = slot
+
+        fire = slot + random.uniform(-self.jitter, self.jitter) * interval
+        return max(fire, now)
+
+    def push(self, key, fire):
+        """Put a target on the internal heap to fire at the given time"""
+        self._sequence += 1
+        heapq.heappush(self._heap, (fire, self._sequence, key))
+
+    def next_fire(self):
+        """Earliest fire time on the heap, or None if it is empty"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return every target on the heap that is due by `now`"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            if key in self._slots:
+                due.append(key)
+        return due
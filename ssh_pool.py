@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+import paramiko
+from contextlib import contextmanager
+from io import StringIO
+
+
+class SSHPool:
+    def __init__(self, ssh_host=None, ssh_port=22, ssh_username=None,
+                 ssh_key_passphrase=None, max_size=4, idle_timeout=300,
+                 keepalive=30, connect_timeout=10):
+        """
+        Initialize the SSHPool class.
+
+        Keeps authenticated SSH connections warm so backups, patches and
+        restarts skip the TCP + key exchange + auth round trips. The private
+        key from SSH_KEY is parsed once and reused, every transport sends
+        keepalives, connections are checked before they are handed out and
+        idle ones are closed after `idle_timeout`.
+
+        Args:
+            ssh_host (str): SSH server hostname/IP
+            ssh_port (int): SSH server port
+            ssh_username (str): SSH username
+            ssh_key_passphrase (str): Passphrase for the SSH key
+            max_size (int): Most connections open at once; callers wait when all are busy
+            idle_timeout (float): Seconds an unused connection is kept open
+            keepalive (int): Seconds between transport keepalive packets
+            connect_timeout (float): Seconds allowed for the TCP connect and handshake
+        """
+        self.ssh_host = ssh_host
+        self.ssh_port = ssh_port
+        self.ssh_username = ssh_username
+        self.ssh_key_passphrase = ssh_key_passphrase
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+
+        self.opened = 0
+        self.reused = 0
+        self._idle = []  # (client, released_at), most recently used last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._key = None
+        self._key_source = None
+        self._key_lock = threading.Lock()
+        self._closed = False
+        self._reaper = None
+
+    def _private_key(self):
+        """Parse SSH_KEY once, re-parsing only if the variable changes"""
+        ssh_key_data = os.getenv("SSH_KEY")
+        if not ssh_key_data:
+            raise ValueError("SSH_KEY environment variable is not set or empty.")
+        with self._key_lock:
+            if self._key is None or self._key_source != ssh_key_data:
+                # Replace literal \n with actual newlines
+                private_key = paramiko.Ed25519Key.from_private_key(
+                    StringIO(ssh_key_data.replace("\\n", "\n")), password=self.ssh_key_passphrase
+                )
+                self._key, self._key_source = private_key, ssh_key_data
+            return self._key
+
+    def _open(self):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=self.ssh_host,
+            port=self.ssh_port,
+            username=self.ssh_username,
+            pkey=self._private_key(),
+            timeout=self.connect_timeout,
+            banner_timeout=self.connect_timeout,
+            auth_timeout=self.connect_timeout,
+            look_for_keys=False,
+            allow_agent=False
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        self.opened += 1
+        return client
+
+    @staticmethod
+    def _healthy(client):
+        """Check that the transport is up, writing an ignore packet to catch dead sockets"""
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """
+        Get a connected client, reusing an idle one when possible
+
+        Returns:
+            paramiko.SSHClient: Connected SSH client, or None if connecting failed
+        """
+        with self._cond:
+            self._evict_idle()
+            while True:
+                while self._idle:
+                    client, _ = self._idle.pop()
+                    if self._healthy(client):
+                        self._in_use += 1
+                        self.reused += 1
+                        return client
+                    client.close()
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+                self._cond.wait()
+            self._start_reaper()
+
+        # Connect outside the lock so other callers are not held up by a slow handshake
+        try:
+            return self._open()
+        except Exception as e:
+            print(f"SSH connection error: {e}")
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify_all()
+            return None
+
+    def release(self, client):
+        """Return a client to the pool, closing it if it is no longer usable"""
+        with self._cond:
+            self._in_use -= 1
+            if self._closed or not self._healthy(client):
+                client.close()
+            else:
+                self._idle.append((client, time.monotonic()))
+            # notify_all, since the reaper waits on the same condition
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a client for the duration of a with block
+
+        Yields:
+            paramiko.SSHClient: Connected SSH client, or None if connecting failed
+        """
+        client = self.acquire()
+        try:
+            yield client
+        finally:
+            if client is not None:
+                self.release(client)
+
+    def _evict_idle(self):
+        """Close connections idle for longer than idle_timeout (caller holds the lock)"""
+        cutoff = time.monotonic() - self.idle_timeout
+        keep = []
+        for client, released_at in self._idle:
+            if released_at < cutoff:
+                client.close()
+            else:
+                keep.append((client, released_at))
+        self._idle = keep
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        with self._cond:
+            while not self._closed:
+                self._cond.wait(timeout=max(self.idle_timeout / 2, 1))
+                self._evict_idle()
+
+    def close(self):
+        """Close every idle connection; busy ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            for client, _ in self._idle:
+                client.close()
+            self._idle = []
+            self._cond.notify_all()
@@ -0,0 +1,400 @@
+"""
+Local stand-ins used by the benchmarks, so nothing touches the real server.
+
+SSHStandIn is a paramiko SSH server bound to 127.0.0.1. Its SFTP subsystem
+serves a local directory and exec requests run through the local shell, which
+is enough for Backup and PatchUpdate to run unchanged against it.
+
+PortStandIn opens thousands of listening and closed ports, APIStandIn serves
+a fake /submit-transaction with adjustable latency and failure rate, and
+BotStandIn records the messages ServerMonitor would send to Discord.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import resource
+import selectors
+import socket
+import stat
+import subprocess
+import threading
+import paramiko
+from aiohttp import web
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, SFTP_OK
+
+
+class _LocalSFTPHandle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return SFTP_OK
+
+
+class _LocalSFTPServer(SFTPServerInterface):
+    """SFTP subsystem that serves a local directory as "/" """
+
+    def __init__(self, server, *args, root=None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+
+    def _local(self, path):
+        path = self.canonicalize(path)
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def canonicalize(self, path):
+        return os.path.normpath("/" + path).replace("\\", "/")
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            entries = []
+            for name in os.listdir(local):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(local, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            binary = getattr(os, "O_BINARY", 0)
+            fd = os.open(local, flags | binary, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _LocalSFTPHandle(flags)
+        handle.filename = local
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            if os.path.exists(self._local(newpath)):
+                return SFTPServer.convert_errno(17)
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            if attr._flags & attr.FLAG_PERMISSIONS:
+                os.chmod(self._local(path), stat.S_IMODE(attr.st_mode))
+            if attr._flags & attr.FLAG_AMTIME:
+                os.utime(self._local(path), (attr.st_atime, attr.st_mtime))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class _StandInServer(paramiko.ServerInterface):
+    """Accepts any public key and serves sftp and exec requests"""
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+def _run_exec(channel, command):
+    """Run an exec request locally and stream its output over the channel"""
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_reader = threading.Thread(
+        target=lambda: channel.sendall_stderr(process.stderr.read()), daemon=True
+    )
+    stderr_reader.start()
+    while True:
+        chunk = process.stdout.read1(65536)
+        if not chunk:
+            break
+        channel.sendall(chunk)
+    stderr_reader.join()
+    channel.send_exit_status(process.wait())
+    channel.close()
+
+
+class SSHStandIn:
+    def __init__(self, root="/"):
+        """
+        Initialize the SSHStandIn class and start accepting connections.
+
+        SFTP paths map onto `root`, exec requests run through the local shell,
+        and any public key is accepted. Point SSH_KEY at client_key_data and
+        connect to 127.0.0.1:port.
+
+        Args:
+            root (str): Local directory served as the SFTP root
+        """
+        self.root = root
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.client_key_data = generate_client_key()
+        self.connections = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(100)
+        self.port = self._sock.getsockname()[1]
+        self._transports = []
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _LocalSFTPServer, root=self.root)
+            transport.start_server(server=_StandInServer())
+            self._transports.append(transport)
+
+    def close(self):
+        self._running = False
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+
+def generate_client_key():
+    """Fresh Ed25519 private key in OpenSSH format, as expected in SSH_KEY"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    return Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.OpenSSH,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def raise_fd_limit(needed):
+    """Lift the soft open-file limit so thousands of sockets fit"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def open_local_ports(count, listening=True):
+    """Bind `count` sockets on 127.0.0.1, listening or bound-but-closed"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        if listening:
+            sock.listen(128)
+        sockets.append(sock)
+    return sockets
+
+
+def open_stalled_ports(count):
+    """Listening sockets with a full backlog, so further connects hang"""
+    sockets = []
+    for sock in open_local_ports(count, listening=False):
+        sock.listen(0)
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(sock.getsockname())
+        sockets.extend((sock, filler))
+    return sockets
+
+
+class PortStandIn:
+    def __init__(self, listening=1000, closed=100):
+        """
+        Initialize the PortStandIn class and start accepting connections.
+
+        Listening ports accept and immediately close every connection on a
+        background thread, so their backlogs never fill up however many
+        probe rounds run. Closed ports are bound but never listen, so
+        connects to them are refused.
+
+        Args:
+            listening (int): Number of open ports
+            closed (int): Number of closed ports
+        """
+        raise_fd_limit((listening + closed) * 3 + 256)
+        self._listeners = open_local_ports(listening, listening=True)
+        self._closed = open_local_ports(closed, listening=False)
+        self.open_ports = [sock.getsockname()[1] for sock in self._listeners]
+        self.closed_ports = [sock.getsockname()[1] for sock in self._closed]
+        self.accepted = 0
+        self._selector = selectors.DefaultSelector()
+        for sock in self._listeners:
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def ports(self):
+        return self.open_ports + self.closed_ports
+
+    def _accept_loop(self):
+        while self._running:
+            for key, _ in self._selector.select(timeout=0.2):
+                try:
+                    client, _ = key.fileobj.accept()
+                    client.close()
+                    self.accepted += 1
+                except OSError:
+                    pass
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._selector.close()
+        for sock in self._listeners + self._closed:
+            sock.close()
+
+
+class APIStandIn:
+    def __init__(self, latency=0.005, jitter=0.0, failure_rate=0.0, error_status=500, seed=429):
+        """
+        Initialize the APIStandIn class and start serving.
+
+        POST /submit-transaction answers like the real service, with a JSON
+        body holding a "hash", after `latency` plus up to `jitter` seconds.
+        A `failure_rate` share of requests gets `error_status` instead. The
+        server runs on its own thread and event loop, and the knobs can be
+        changed while it runs.
+
+        Args:
+            latency (float): Base response delay in seconds
+            jitter (float): Extra random delay of up to this many seconds
+            failure_rate (float): Share of requests that fail, 0 to 1
+            error_status (int): Status code of failed requests
+            seed (int): Seed for the latency and failure random numbers
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._runner = None
+        self.port = None
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/submit-transaction"
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_post("/submit-transaction", self._submit)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _submit(self, request):
+        body = await request.read()
+        self.requests += 1
+        delay = self.latency + self._rng.random() * self.jitter
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.failure_rate:
+            self.failures += 1
+            return web.json_response({"error": "stand-in failure"}, status=self.error_status)
+        return web.json_response({"hash": hashlib.sha256(body).hexdigest()})
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class _RecordingRest:
+    def __init__(self):
+        self.messages = []
+
+    async def create_message(self, channel_id, content=None, **kwargs):
+        self.messages.append((channel_id, content))
+
+
+class BotStandIn:
+    """Just enough of a hikari bot for ServerMonitor and AlertDispatcher: rest.create_message is recorded"""
+
+    def __init__(self):
+        self.rest = _RecordingRest()
+
+    @property
+    def messages(self):
+        return self.rest.messages